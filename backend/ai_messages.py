@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from caching import LRUCache
+
+class AIRateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after:g}s")
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(headers, default: float = 1.0) -> float:
+    # Azure OpenAI sends retry-after-ms alongside the standard header
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return default
+
+
+SYSTEM_PROMPT = "You are a professional networking assistant. Create personalized LinkedIn connection messages that are warm, specific, and actionable."
+
+
+def build_message_prompt(connection_data: dict) -> str:
+    return f"""
+        Create a professional LinkedIn connection message based on this networking interaction:
+
+        Contact: {connection_data.get('contact_name')}
+        Their Role: {connection_data.get('contact_title', 'Professional')} at {connection_data.get('contact_company', 'their company')}
+        Event: {connection_data.get('event_name')} ({connection_data.get('event_type')})
+        Connection Type: {connection_data.get('person_category')}
+        Conversation Summary: {connection_data.get('voice_transcript', 'Had a great conversation')}
+        Additional Notes: {connection_data.get('notes', 'None')}
+
+        Write a personalized LinkedIn connection message that:
+        1. Mentions where we met specifically
+        2. References something from our conversation
+        3. Suggests a relevant next step based on the connection type
+        4. Maintains a professional but friendly tone
+        5. Is concise (under 200 characters for LinkedIn limit)
+
+        Message:
+        """
+
+
+def build_chat_payload(connection_data: dict) -> dict:
+    return {
+        "messages": [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": build_message_prompt(connection_data)
+            }
+        ],
+        "max_tokens": 150,
+        "temperature": 0.7
+    }
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def prompt_fingerprint(model: Optional[str], payload: dict) -> str:
+    # Everything that changes the completion goes into the key
+    canonical = json.dumps({"model": model, "payload": payload}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class AIMessageCache:
+    # Generated messages keyed by prompt fingerprint. A TTL'd in-memory LRU
+    # sits in front of an optional MongoDB collection (expired by a TTL index
+    # on expires_at). Identical requests that arrive together share a single
+    # upstream call.
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 86400.0, collection=None):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries, ttl=ttl)
+        self.collection = collection
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, fingerprint: str) -> Optional[str]:
+        message = self.memory.get(fingerprint)
+        if message is not None or self.collection is None:
+            return message
+        doc = await self.collection.find_one(
+            {"_id": fingerprint, "expires_at": {"$gt": datetime.utcnow()}},
+            {"ai_message": 1, "expires_at": 1}
+        )
+        if doc is None:
+            return None
+        remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+        self.memory.set(fingerprint, doc["ai_message"], ttl=max(remaining, 0))
+        return doc["ai_message"]
+
+    async def set(self, fingerprint: str, message: str):
+        self.memory.set(fingerprint, message)
+        if self.collection is None:
+            return
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": fingerprint},
+            {"$set": {"ai_message": message, "created_at": now, "expires_at": now + timedelta(seconds=self.ttl)}},
+            upsert=True
+        )
+
+    async def get_or_create(self, fingerprint: str, create: Callable[[], Awaitable[Tuple[str, bool]]],
+                            bypass: bool = False) -> str:
+        # create returns (message, store). store=False hands the message to
+        # this caller and any waiting on it without caching it; an empty
+        # message is never cached either. bypass skips
+        # the lookup (deliberate "regenerate") but still stores the fresh
+        # message so later retries see the newest one.
+        if not bypass:
+            message = await self.get(fingerprint)
+            if message is not None:
+                return message
+            pending = self._in_flight.get(fingerprint)
+            if pending is not None:
+                try:
+                    return await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise
+                    # The leading request went away; make the call ourselves
+
+        future = asyncio.get_running_loop().create_future()
+        if not bypass:
+            self._in_flight[fingerprint] = future
+        try:
+            message, store = await create()
+            if store and message:
+                await self.set(fingerprint, message)
+            future.set_result(message)
+            return message
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(fingerprint) is future:
+                del self._in_flight[fingerprint]
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "mongo_tier": self.collection is not None,
+            "in_flight": len(self._in_flight),
+        }
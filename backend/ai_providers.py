@@ -0,0 +1,359 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from ai_messages import AIRateLimited, retry_after_seconds
+from external_integrations.http_clients import HTTPClientRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class AIProviderError(Exception):
+    pass
+
+
+def message_text(text: Optional[str]) -> str:
+    # A content-filtered or blank answer is a failure, so the chain moves on
+    # to the next provider instead of returning an empty message
+    text = (text or "").strip()
+    if not text:
+        raise AIProviderError("AI message generation returned no text")
+    return text
+
+
+class AIProvider:
+    # One upstream that can write a connection message. complete() returns
+    # the whole message, stream() yields it in pieces. Both receive the chat
+    # payload from build_chat_payload and the raw connection data, so a
+    # provider can use whichever it needs.
+
+    name = "base"
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+
+    @property
+    def model_id(self) -> str:
+        return self.name
+
+    async def complete(self, payload: dict, connection_data: dict) -> str:
+        raise NotImplementedError
+
+    async def stream(self, payload: dict, connection_data: dict) -> AsyncIterator[str]:
+        yield await self.complete(payload, connection_data)
+
+
+class AzureOpenAIProvider(AIProvider):
+    name = "azure"
+
+    def __init__(self, registry: HTTPClientRegistry, endpoint: Optional[str], api_key: Optional[str],
+                 model: Optional[str], timeout: float = 30.0, client_name: str = "azure_openai"):
+        super().__init__(timeout)
+        self.registry = registry
+        self.client_name = client_name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.model = model
+
+    @property
+    def model_id(self) -> str:
+        # Kept equal to the model name so existing cache entries stay valid
+        return self.model or self.name
+
+    def _headers(self) -> dict:
+        return {"Content-Type": "application/json", "api-key": self.api_key}
+
+    async def complete(self, payload: dict, connection_data: dict) -> str:
+        response = await self.registry.get(self.client_name).post(
+            self.endpoint,
+            headers=self._headers(),
+            json=payload
+        )
+        if response.status_code == 429:
+            raise AIRateLimited(retry_after_seconds(response.headers))
+        if response.status_code != 200:
+            raise AIProviderError("AI message generation failed")
+        choices = response.json().get("choices") or []
+        return message_text((choices[0].get("message") or {}).get("content") if choices else None)
+
+    async def stream(self, payload: dict, connection_data: dict) -> AsyncIterator[str]:
+        async with self.registry.get(self.client_name).stream(
+            "POST",
+            self.endpoint,
+            headers=self._headers(),
+            json={**payload, "stream": True}
+        ) as response:
+            if response.status_code == 429:
+                raise AIRateLimited(retry_after_seconds(response.headers))
+            if response.status_code != 200:
+                raise AIProviderError("AI message generation failed")
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                # Azure sends content-filter chunks with no choices
+                choices = json.loads(data).get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+
+
+class CohereProvider(AIProvider):
+    # Cohere's v2 chat API takes the same system/user messages. Called over
+    # the shared HTTP client registry like the other upstreams rather than
+    # through the SDK's own client.
+
+    name = "cohere"
+
+    def __init__(self, registry: HTTPClientRegistry, api_key: Optional[str], model: str,
+                 endpoint: str = "https://api.cohere.com/v2/chat", timeout: float = 30.0,
+                 client_name: str = "cohere"):
+        super().__init__(timeout)
+        self.registry = registry
+        self.client_name = client_name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.model = model
+
+    @property
+    def model_id(self) -> str:
+        return f"cohere:{self.model}"
+
+    def _request(self, payload: dict, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "messages": payload["messages"],
+            "max_tokens": payload.get("max_tokens"),
+            "temperature": payload.get("temperature"),
+            "stream": stream,
+        }
+
+    def _headers(self) -> dict:
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+
+    async def complete(self, payload: dict, connection_data: dict) -> str:
+        response = await self.registry.get(self.client_name).post(
+            self.endpoint,
+            headers=self._headers(),
+            json=self._request(payload, stream=False)
+        )
+        if response.status_code == 429:
+            raise AIRateLimited(retry_after_seconds(response.headers))
+        if response.status_code != 200:
+            raise AIProviderError("AI message generation failed")
+        content = (response.json().get("message") or {}).get("content") or []
+        return message_text("".join(part.get("text") or "" for part in content))
+
+    async def stream(self, payload: dict, connection_data: dict) -> AsyncIterator[str]:
+        async with self.registry.get(self.client_name).stream(
+            "POST",
+            self.endpoint,
+            headers=self._headers(),
+            json=self._request(payload, stream=True)
+        ) as response:
+            if response.status_code == 429:
+                raise AIRateLimited(retry_after_seconds(response.headers))
+            if response.status_code != 200:
+                raise AIProviderError("AI message generation failed")
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):].strip())
+                if event.get("type") == "message-end":
+                    break
+                if event.get("type") == "content-delta":
+                    text = event["delta"]["message"]["content"].get("text")
+                    if text:
+                        yield text
+
+
+NEXT_STEPS = {
+    "Potential Collaborator": "Would love to explore working on something together.",
+    "Industry Expert": "I'd value your take on where the field is heading.",
+    "Investor": "Happy to share more about what we're building.",
+    "Client Prospect": "Could we set up a quick call to see if we can help?",
+    "Mentor": "Would you be open to a coffee chat sometime?",
+    "Mentee": "Happy to help however I can.",
+}
+
+
+class TemplateProvider(AIProvider):
+    # Deterministic, local and free: fills a fixed template from the
+    # connection data. Used for load testing and as a last-resort fallback.
+    # latency simulates upstream time so load tests keep a realistic shape.
+
+    name = "template"
+
+    def __init__(self, latency: float = 0.0, timeout: float = 5.0):
+        super().__init__(timeout)
+        self.latency = latency
+
+    @staticmethod
+    def render(connection_data: dict) -> str:
+        first_name = (connection_data.get("contact_name") or "there").split()[0]
+        event = connection_data.get("event_name") or "the event"
+        next_step = NEXT_STEPS.get(connection_data.get("person_category"), "Let's stay in touch.")
+        message = f"Hi {first_name}, great meeting you at {event}! {next_step}"
+        return message[:200]
+
+    async def complete(self, payload: dict, connection_data: dict) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.render(connection_data)
+
+    async def stream(self, payload: dict, connection_data: dict) -> AsyncIterator[str]:
+        words = (await self.complete(payload, connection_data)).split(" ")
+        for index, word in enumerate(words):
+            yield word if index == 0 else f" {word}"
+
+
+class AIReply:
+    # A chain answer and the provider that gave it. stream() fills in
+    # provider once the first piece arrives, and text is left to the caller.
+
+    def __init__(self, text: str = "", provider: Optional[str] = None):
+        self.text = text
+        self.provider = provider
+
+
+class ProviderStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+        self.total_seconds = 0.0
+        self.cooldown_until = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rate_limited": self.rate_limited,
+            "avg_seconds": round(self.total_seconds / self.calls, 4) if self.calls else None,
+            "cooling_down": self.cooldown_until > time.monotonic(),
+        }
+
+
+class AIProviderChain:
+    # Tries providers in order. Each attempt gets the provider's own timeout;
+    # a timeout, 429 or upstream error moves on to the next provider and
+    # benches the failed one for `cooldown` seconds so later requests don't
+    # pay the same timeout again. When every provider was rate limited the
+    # caller sees AIRateLimited with the shortest Retry-After.
+
+    def __init__(self, providers: List[AIProvider], cooldown: float = 30.0):
+        if not providers:
+            raise ValueError("At least one AI provider is required")
+        self.providers = providers
+        self.cooldown = cooldown
+        self._stats = {provider.name: ProviderStats() for provider in providers}
+
+    @property
+    def primary(self) -> str:
+        # Only this provider's answers are cached; a fallback (say the
+        # template) would otherwise keep being served after it recovers
+        return self.providers[0].name
+
+    @property
+    def model_id(self) -> str:
+        # Part of the cache key; a different chain may produce different text
+        ids = [provider.model_id for provider in self.providers]
+        if len(ids) == 1:
+            return ids[0]
+        return "chain:" + hashlib.sha256("|".join(ids).encode()).hexdigest()[:16]
+
+    def _candidates(self) -> List[AIProvider]:
+        now = time.monotonic()
+        ready = [p for p in self.providers if self._stats[p.name].cooldown_until <= now]
+        # If everything is benched, try them all rather than fail outright
+        return ready or list(self.providers)
+
+    def _failed(self, provider: AIProvider, error: Exception):
+        stats = self._stats[provider.name]
+        if isinstance(error, asyncio.TimeoutError):
+            stats.timeouts += 1
+        elif isinstance(error, AIRateLimited):
+            stats.rate_limited += 1
+        else:
+            stats.failures += 1
+        pause = error.retry_after if isinstance(error, AIRateLimited) else self.cooldown
+        stats.cooldown_until = time.monotonic() + pause
+        logger.warning("AI provider %s failed, trying the next one: %r", provider.name, error)
+
+    @staticmethod
+    def _give_up(errors: List[Exception]):
+        if errors and all(isinstance(e, AIRateLimited) for e in errors):
+            raise AIRateLimited(min(e.retry_after for e in errors))
+        if errors and all(isinstance(e, asyncio.TimeoutError) for e in errors):
+            raise AIProviderError("AI message generation timed out")
+        raise AIProviderError("AI message generation failed")
+
+    async def complete(self, payload: dict, connection_data: dict) -> AIReply:
+        errors = []
+        for provider in self._candidates():
+            stats = self._stats[provider.name]
+            stats.calls += 1
+            started = time.monotonic()
+            try:
+                message = await asyncio.wait_for(provider.complete(payload, connection_data), provider.timeout)
+            except (asyncio.TimeoutError, AIRateLimited, AIProviderError, httpx.HTTPError) as e:
+                self._failed(provider, e)
+                errors.append(e)
+                continue
+            finally:
+                stats.total_seconds += time.monotonic() - started
+            stats.cooldown_until = 0.0
+            return AIReply(message, provider.name)
+        self._give_up(errors)
+
+    async def stream(self, payload: dict, connection_data: dict,
+                     reply: Optional[AIReply] = None) -> AsyncIterator[str]:
+        # Failover is only possible before the first piece has been sent;
+        # after that an error ends the stream. The provider's timeout bounds
+        # the wait for each piece. reply, if given, records who answered.
+        errors = []
+        for provider in self._candidates():
+            stats = self._stats[provider.name]
+            stats.calls += 1
+            started = time.monotonic()
+            pieces = provider.stream(payload, connection_data)
+            sent = False
+            try:
+                while True:
+                    try:
+                        content = await asyncio.wait_for(pieces.__anext__(), provider.timeout)
+                    except StopAsyncIteration:
+                        break
+                    if not sent and reply is not None:
+                        reply.provider = provider.name
+                    sent = True
+                    yield content
+            except (asyncio.TimeoutError, AIRateLimited, AIProviderError, httpx.HTTPError) as e:
+                if sent:
+                    stats.failures += 1
+                    raise
+                self._failed(provider, e)
+                errors.append(e)
+                continue
+            finally:
+                stats.total_seconds += time.monotonic() - started
+                await pieces.aclose()
+            stats.cooldown_until = 0.0
+            return
+        self._give_up(errors)
+
+    def stats(self) -> dict:
+        return {
+            "order": [provider.name for provider in self.providers],
+            "providers": {name: stats.as_dict() for name, stats in self._stats.items()},
+        }
@@ -0,0 +1,134 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+from caching import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Connection counts per event are kept in small rollup documents, one per
+# (event_name, dimension, value): dimension "all" holds the event total,
+# the others break it down by that connection field. Each row counts
+# connections ("total") and how many have connection_sent ("sent").
+DIMENSIONS = ("person_category", "event_type")
+ALL = "all"
+
+# Same rows as the incremental updates below, computed from scratch
+REBUILD_PIPELINE = [
+    {"$project": {
+        "event_name": 1,
+        "sent": {"$cond": [{"$eq": ["$connection_sent", True]}, 1, 0]},
+        "rows": [{"dimension": ALL, "value": ""}] + [
+            {"dimension": dimension, "value": {"$ifNull": [f"${dimension}", ""]}} for dimension in DIMENSIONS
+        ],
+    }},
+    {"$unwind": "$rows"},
+    {"$group": {
+        "_id": {"event_name": "$event_name", "dimension": "$rows.dimension", "value": "$rows.value"},
+        "total": {"$sum": 1},
+        "sent": {"$sum": "$sent"},
+    }},
+    {"$addFields": {"event_name": "$_id.event_name", "dimension": "$_id.dimension", "value": "$_id.value"}},
+]
+
+
+def _rate(sent: int, total: int) -> float:
+    return round(sent / total, 4) if total else 0.0
+
+
+def _row(doc: dict) -> dict:
+    return {"total": doc["total"], "sent": doc["sent"], "sent_rate": _rate(doc["sent"], doc["total"])}
+
+
+class ConnectionAnalytics:
+    # Keeps the rollups current as connections are written, so dashboards
+    # read a handful of documents per event instead of aggregating the
+    # connections collection. Writes pass (before, after) pairs to record();
+    # rebuild() recomputes everything if the counters ever drift (a failed
+    # rollup write, or connections changed outside the API).
+
+    def __init__(self, rollups, connections, cache_ttl: float = 2.0, max_events: int = 1024):
+        self.rollups = rollups
+        self.connections = connections
+        # Dashboards poll; a short TTL keeps repeated reads off MongoDB while
+        # other workers' writes show up within cache_ttl seconds
+        self.cache = LRUCache(max_events, ttl=cache_ttl)
+
+    def _keys(self, connection: dict) -> Iterable[Tuple[str, str, str]]:
+        event_name = connection.get("event_name")
+        yield event_name, ALL, ""
+        for dimension in DIMENSIONS:
+            yield event_name, dimension, connection.get(dimension) or ""
+
+    async def record(self, changes: List[Tuple[Optional[dict], Optional[dict]]]):
+        # (None, doc) for a new connection, (old, new) for an update
+        deltas: Dict[Tuple[str, str, str], List[int]] = {}
+        for before, after in changes:
+            for doc, sign in ((before, -1), (after, 1)):
+                if doc is None:
+                    continue
+                sent = sign if doc.get("connection_sent") else 0
+                for key in self._keys(doc):
+                    delta = deltas.setdefault(key, [0, 0])
+                    delta[0] += sign
+                    delta[1] += sent
+        operations = [
+            UpdateOne(
+                {"_id": {"event_name": event_name, "dimension": dimension, "value": value}},
+                {
+                    "$inc": {"total": total, "sent": sent},
+                    "$setOnInsert": {"event_name": event_name, "dimension": dimension, "value": value},
+                },
+                upsert=True
+            )
+            for (event_name, dimension, value), (total, sent) in deltas.items() if total or sent
+        ]
+        if not operations:
+            return
+        try:
+            await self.rollups.bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            # The connection itself is already stored; failing the request
+            # would only invite a duplicate retry. rebuild() repairs this.
+            logger.warning("Could not update connection analytics: %s", e)
+        for event_name in {key[0] for key in deltas}:
+            self.cache.pop(event_name)
+
+    async def event_summary(self, event_name: str) -> Optional[dict]:
+        summary = self.cache.get(event_name)
+        if summary is None:
+            docs = await self.rollups.find({"event_name": event_name, "total": {"$gt": 0}}, {"_id": 0}).to_list(None)
+            totals = next((doc for doc in docs if doc["dimension"] == ALL), None)
+            if totals is None:
+                return None
+            summary = {"event_name": event_name, **_row(totals)}
+            for dimension in DIMENSIONS:
+                rows = sorted((doc for doc in docs if doc["dimension"] == dimension), key=lambda doc: -doc["total"])
+                summary[f"by_{dimension}"] = [{"value": doc["value"], **_row(doc)} for doc in rows]
+            self.cache.set(event_name, summary)
+        return summary
+
+    async def events(self, limit: int = 50) -> List[dict]:
+        # Busiest events first. Not invalidated on writes; the TTL bounds
+        # how stale the ranking gets.
+        key = ("events", limit)
+        events = self.cache.get(key)
+        if events is None:
+            cursor = self.rollups.find(
+                {"dimension": ALL, "total": {"$gt": 0}}, {"_id": 0}
+            ).sort("total", DESCENDING).limit(limit)
+            events = [{"event_name": doc["event_name"], **_row(doc)} async for doc in cursor]
+            self.cache.set(key, events)
+        return events
+
+    async def rebuild(self) -> int:
+        # $out swaps the rollup collection in one step; increments made while
+        # the pipeline runs may be lost, so run this when writes are quiet
+        await self.connections.aggregate(REBUILD_PIPELINE + [{"$out": self.rollups.name}]).to_list(None)
+        self.cache.clear()
+        return await self.rollups.count_documents({})
+
+    def stats(self) -> dict:
+        return {"cache": self.cache.stats()}
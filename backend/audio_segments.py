@@ -0,0 +1,60 @@
+import asyncio
+import os
+import shutil
+from typing import BinaryIO, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+
+def ffmpeg_path() -> Optional[str]:
+    return os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+
+
+def audio_suffix(filename: Optional[str], content_type: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext:
+        return ext
+    subtype = (content_type or "").split(";")[0].split("/")[-1]
+    return {"mpeg": ".mp3", "x-wav": ".wav", "wave": ".wav"}.get(subtype, f".{subtype}" if subtype else ".webm")
+
+
+async def split_audio(source: BinaryIO, suffix: str, segment_seconds: int, work_dir: str) -> List[str]:
+    # Cuts the recording into segment_seconds pieces with ffmpeg's segment
+    # muxer. Streams are copied, not re-encoded, so this is I/O bound. The
+    # source is piped through stdin in chunks and never read into memory.
+    binary = ffmpeg_path()
+    if binary is None:
+        raise RuntimeError("ffmpeg is not available")
+
+    pattern = os.path.join(work_dir, f"segment-%04d{suffix}")
+    process = await asyncio.create_subprocess_exec(
+        binary, "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-map", "0:a", "-c", "copy",
+        "-f", "segment", "-segment_time", str(segment_seconds), "-reset_timestamps", "1",
+        pattern,
+        stdin=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def feed():
+        try:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            process.stdin.close()
+
+    _, stderr = await asyncio.gather(feed(), process.stderr.read())
+    if await process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()[:200]}")
+
+    return sorted(
+        os.path.join(work_dir, name) for name in os.listdir(work_dir)
+        if name.startswith("segment-")
+    )
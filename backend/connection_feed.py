@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+FEED_MODES = ("auto", "change_stream", "local")
+WATCH_PIPELINE = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+
+
+class FeedFull(Exception):
+    pass
+
+
+class FeedSubscription:
+    # One connected client. Changes are coalesced by connection id (the
+    # latest version wins) and handed out as batches. A client that falls
+    # more than max_pending changes behind is sent "resync" instead of
+    # buffering without bound, and re-reads the list over REST.
+
+    def __init__(self, user_id: str, max_pending: int, linger: float):
+        self.user_id = user_id
+        self.max_pending = max_pending
+        self.linger = linger
+        self.pending: "OrderedDict[str, dict]" = OrderedDict()
+        self.overflowed = False
+        self.sent = 0
+        self.resyncs = 0
+        self._ready = asyncio.Event()
+
+    def push(self, connection: dict):
+        if not self.overflowed:
+            self.pending.pop(connection["id"], None)
+            self.pending[connection["id"]] = connection
+            if len(self.pending) > self.max_pending:
+                self.pending.clear()
+                self.overflowed = True
+        self._ready.set()
+
+    async def next_message(self, heartbeat: float) -> dict:
+        try:
+            await asyncio.wait_for(self._ready.wait(), heartbeat)
+        except asyncio.TimeoutError:
+            return {"type": "ping"}
+        # Let a burst (bulk import, batch follow-ups) land in one message
+        if self.linger:
+            await asyncio.sleep(self.linger)
+        self._ready.clear()
+        if self.overflowed:
+            self.overflowed = False
+            self.resyncs += 1
+            return {"type": "resync"}
+        items = list(self.pending.values())
+        self.pending.clear()
+        self.sent += len(items)
+        return {"type": "connections", "items": items}
+
+
+class ConnectionFeed:
+    # Pushes new and changed connections to each user's open WebSockets and
+    # SSE streams. One MongoDB change stream per process feeds every
+    # subscriber, so it sees writes from any worker or device. Where change
+    # streams aren't available (standalone mongod), the write endpoints
+    # publish() instead, which only reaches this process's subscribers.
+
+    def __init__(self, collection, fields: Iterable[str], mode: str = "auto",
+                 max_pending: int = 200, linger: float = 0.05, max_subscribers: int = 10000):
+        if mode not in FEED_MODES:
+            raise ValueError(f"Unknown connection feed mode: {mode}")
+        self.collection = collection
+        self.fields = tuple(fields)
+        self.mode = mode
+        self.max_pending = max_pending
+        self.linger = linger
+        self.max_subscribers = max_subscribers
+        self.source = "local"
+        self._subscribers: Dict[str, Set[FeedSubscription]] = {}
+        self._count = 0
+        self._watcher: Optional[asyncio.Task] = None
+        self.delivered = 0
+
+    def _shape(self, doc: dict) -> dict:
+        return {field: doc.get(field) for field in self.fields}
+
+    def dispatch(self, doc: dict):
+        subscribers = self._subscribers.get(doc.get("user_id"))
+        if not subscribers:
+            return
+        connection = self._shape(doc)
+        for subscription in subscribers:
+            subscription.push(connection)
+        self.delivered += len(subscribers)
+
+    def publish(self, doc: dict):
+        # Called by the write endpoints; the change stream covers them when on
+        if self.source == "local":
+            self.dispatch(doc)
+
+    @property
+    def full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: str):
+        if self.full:
+            raise FeedFull("Too many live connection feeds")
+        subscription = FeedSubscription(user_id, self.max_pending, self.linger)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        self._count += 1
+        try:
+            yield subscription
+        finally:
+            self._count -= 1
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    async def start(self):
+        if self.mode != "local" and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    async def _watch(self):
+        resume_after = None
+        opened = False
+        while True:
+            try:
+                async with self.collection.watch(
+                    WATCH_PIPELINE, full_document="updateLookup", resume_after=resume_after
+                ) as stream:
+                    opened = True
+                    self.source = "change_stream"
+                    async for change in stream:
+                        resume_after = change["_id"]
+                        if change.get("fullDocument"):
+                            self.dispatch(change["fullDocument"])
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if not opened and self.mode == "auto":
+                    logger.info("Change streams unavailable (%s); connection feed uses in-process publish", e)
+                    self.source = "local"
+                    return
+                # e.g. the resume token fell off the oplog; start fresh
+                logger.warning("Connection change stream failed, reopening: %s", e)
+                resume_after = None
+            except (PyMongoError, NotImplementedError) as e:
+                if not opened and self.mode == "auto":
+                    logger.info("Change streams unavailable (%s); connection feed uses in-process publish", e)
+                    self.source = "local"
+                    return
+                logger.warning("Connection change stream interrupted, resuming: %s", e)
+            # Publish locally while the stream is down so this process's
+            # subscribers still see its own writes
+            self.source = "local"
+            await asyncio.sleep(1.0)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "source": self.source,
+            "users": len(self._subscribers),
+            "subscribers": self._count,
+            "max_subscribers": self.max_subscribers,
+            "delivered": self.delivered,
+        }
+
+
+def sse_frame(message: dict) -> bytes:
+    return b"event: " + message["type"].encode() + b"\ndata: " + dumps(message) + b"\n\n"
+
+
+async def pump_websocket(websocket, subscription: FeedSubscription, heartbeat: float, send_timeout: float):
+    # Sends batches until the client goes away. A client that can't take a
+    # message within send_timeout is dropped; its socket buffer is full.
+    async def sender():
+        await websocket.send_text(dumps({"type": "ready"}).decode())
+        while True:
+            message = await subscription.next_message(heartbeat)
+            await asyncio.wait_for(websocket.send_text(dumps(message).decode()), send_timeout)
+
+    async def receiver():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(sender()), asyncio.create_task(receiver())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in done:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from bson.binary import Binary
+from pymongo import ReplaceOne
+
+from caching import LRUCache
+from embeddings import DOCUMENT, QUERY, Embedder, vector_from_bytes, vector_to_bytes
+from vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TEXT_FIELDS = ("contact_name", "contact_company", "notes", "voice_transcript")
+SEARCH_MODES = ("text", "semantic", "hybrid")
+
+# Deepest result a page can reach (offset + limit); rankings are built up
+# to here and sliced, so this bounds the work per request
+SEARCH_MAX_RESULTS = 1000
+
+# Reciprocal rank fusion constant for hybrid mode (the usual 60)
+RRF_K = 60
+
+# Transcripts can run long; embedding models truncate anyway
+MAX_EMBED_CHARS = 4000
+
+# Other workers' embeddings are picked up by updated_at; the overlap covers
+# clock skew between them
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+def embedding_text(connection: dict) -> str:
+    parts = [connection.get(field) for field in SEARCH_TEXT_FIELDS]
+    return "\n".join(part.strip() for part in parts if part and part.strip())[:MAX_EMBED_CHARS]
+
+
+class _UserIndex:
+    def __init__(self, index: Optional[VectorIndex], loaded_through: datetime):
+        self.index = index
+        self.loaded_through = loaded_through
+        self.checked_at = time.monotonic()
+
+
+class ConnectionSearch:
+    # Ranked search over one user's connections. Keywords go through the
+    # (user_id, text) index on connections. Semantic queries are embedded and
+    # compared against the user's connection embeddings, which live in
+    # their own collection as float32 bytes and are loaded into an in-memory
+    # VectorIndex on first use. Loaded indexes are an LRU bounded both by
+    # users (max_users) and by their total size (max_bytes), since one user
+    # can have far more connections than another. Hybrid fuses both rankings
+    # with reciprocal rank fusion.
+    #
+    # New and edited connections are queued with enqueue() and embedded in
+    # batches in the background, so writes never wait on the model.
+
+    def __init__(self, connections, embeddings, embedder: Optional[Embedder] = None,
+                 max_users: int = 64, max_bytes: int = 1 << 30, refresh_interval: float = 5.0,
+                 batch_delay: float = 0.5):
+        self.connections = connections
+        self.embeddings = embeddings
+        self.embedder = embedder
+        self.refresh_interval = refresh_interval
+        self.batch_delay = batch_delay
+        self.max_bytes = max_bytes
+        self._indexes = LRUCache(max_users)
+        self._queries = LRUCache(1024, ttl=600)
+        self._pending: Dict[str, dict] = {}
+        self._wake = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._backfill: Optional[asyncio.Task] = None
+        self.embedded = 0
+        self.failed_batches = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.embedder is not None
+
+    # Indexing
+
+    def enqueue(self, connection: dict):
+        if self.embedder is not None:
+            self._pending[connection["id"]] = connection
+            self._wake.set()
+
+    async def start(self):
+        if self.embedder is not None and self._worker is None:
+            await self.embedder.start()
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        for task in (self._worker, self._backfill):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._worker = self._backfill = None
+        if self.embedder is not None:
+            await self.embedder.close()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            # Gather a burst (bulk import) into full batches
+            await asyncio.sleep(self.batch_delay)
+            self._wake.clear()
+            while self._pending:
+                ids = list(self._pending)[:self.embedder.max_batch]
+                batch = [self._pending.pop(key) for key in ids]
+                try:
+                    await self._embed_and_store(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Keep newer edits that arrived meanwhile; retry later
+                    logger.warning("Embedding %s connections failed, retrying: %s", len(batch), e)
+                    self.failed_batches += 1
+                    for connection in batch:
+                        self._pending.setdefault(connection["id"], connection)
+                    await asyncio.sleep(5.0)
+
+    async def _embed_and_store(self, connections: List[dict]):
+        vectors = await self.embedder.embed([embedding_text(c) for c in connections], DOCUMENT)
+        now = datetime.utcnow()
+        await self.embeddings.bulk_write([
+            ReplaceOne({"_id": connection["id"]}, {
+                "_id": connection["id"],
+                "user_id": connection["user_id"],
+                "model": self.embedder.model_id,
+                "vector": Binary(vector_to_bytes(vector)),
+                "updated_at": now,
+            }, upsert=True)
+            for connection, vector in zip(connections, vectors)
+        ], ordered=False)
+        self.embedded += len(connections)
+        # Keep this worker's loaded indexes current without a reload
+        for connection, vector in zip(connections, vectors):
+            entry = self._indexes.get(connection["user_id"])
+            if entry is not None:
+                if entry.index is None:
+                    entry.index = VectorIndex(len(vector))
+                entry.index.upsert([connection["id"]], vector[None, :])
+        self._evict()
+
+    def backfill(self, user_id: Optional[str] = None) -> bool:
+        # Embeds connections that have no vector for the current model yet.
+        # Runs in the background; returns False if one is already running.
+        if self.embedder is None or (self._backfill is not None and not self._backfill.done()):
+            return False
+        self._backfill = asyncio.create_task(self._run_backfill(user_id))
+        return True
+
+    async def _run_backfill(self, user_id: Optional[str]):
+        scope = {"user_id": user_id} if user_id else {}
+        done = set()
+        async for doc in self.embeddings.find({**scope, "model": self.embedder.model_id}, {"_id": 1}):
+            done.add(doc["_id"])
+        batch = []
+        projection = {"_id": 0, "id": 1, "user_id": 1, **{field: 1 for field in SEARCH_TEXT_FIELDS}}
+        async for connection in self.connections.find(scope, projection):
+            if connection["id"] in done:
+                continue
+            batch.append(connection)
+            if len(batch) == self.embedder.max_batch:
+                await self._embed_and_store(batch)
+                batch = []
+        if batch:
+            await self._embed_and_store(batch)
+        logger.info("Connection embedding backfill finished (%s embedded so far)", self.embedded)
+
+    def _loaded_bytes(self) -> int:
+        return sum(entry.index.nbytes for entry in self._indexes.values() if entry.index is not None)
+
+    def _evict(self, keep: Optional[str] = None):
+        # Drops least recently used users until the loaded indexes fit in
+        # max_bytes. keep (the user being searched) always stays loaded.
+        loaded = self._loaded_bytes()
+        for user_id in self._indexes.keys():
+            if loaded <= self.max_bytes:
+                break
+            if user_id == keep:
+                continue
+            entry = self._indexes.pop(user_id)
+            if entry is not None and entry.index is not None:
+                loaded -= entry.index.nbytes
+
+    # Queries
+
+    async def _user_index(self, user_id: str) -> Optional[VectorIndex]:
+        entry = self._indexes.get(user_id)
+        query = {"user_id": user_id, "model": self.embedder.model_id}
+        if entry is None:
+            entry = _UserIndex(None, datetime.utcnow())
+        elif time.monotonic() - entry.checked_at >= self.refresh_interval:
+            since = entry.loaded_through - REFRESH_OVERLAP
+            entry.loaded_through = datetime.utcnow()
+            entry.checked_at = time.monotonic()
+            query["updated_at"] = {"$gte": since}
+        else:
+            return entry.index
+
+        ids, vectors = [], []
+        async for doc in self.embeddings.find(query, {"vector": 1}).batch_size(5000):
+            ids.append(doc["_id"])
+            vectors.append(vector_from_bytes(doc["vector"]))
+        if vectors:
+            if entry.index is None:
+                entry.index = VectorIndex(len(vectors[0]), capacity=max(1024, len(vectors)))
+            entry.index.upsert(ids, np.vstack(vectors))
+        self._indexes.set(user_id, entry)
+        self._evict(keep=user_id)
+        return entry.index
+
+    async def _query_vector(self, q: str) -> np.ndarray:
+        key = (self.embedder.model_id, q)
+        vector = self._queries.get(key)
+        if vector is None:
+            vector = (await self.embedder.embed([q], QUERY))[0]
+            self._queries.set(key, vector)
+        return vector
+
+    async def _text_ranking(self, user_id: str, q: str, n: int) -> List[Tuple[str, float]]:
+        cursor = self.connections.find(
+            {"user_id": user_id, "$text": {"$search": q}},
+            {"_id": 0, "id": 1, "score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(n)
+        return [(doc["id"], doc["score"]) async for doc in cursor]
+
+    async def _semantic_ranking(self, user_id: str, q: str, n: int) -> List[Tuple[str, float]]:
+        vector = await self._query_vector(q)
+        index = await self._user_index(user_id)
+        return index.search(vector, n) if index is not None else []
+
+    async def search(self, user_id: str, q: str, mode: str, limit: int, offset: int,
+                     projection: dict) -> Tuple[List[dict], bool]:
+        # Returns one page of connections (best first, each with a "score")
+        # and whether there are more
+        n = min(offset + limit + 1, SEARCH_MAX_RESULTS)
+        if mode == "text":
+            ranking = await self._text_ranking(user_id, q, n)
+        elif mode == "semantic":
+            ranking = await self._semantic_ranking(user_id, q, n)
+        else:
+            text, semantic = await asyncio.gather(
+                self._text_ranking(user_id, q, n), self._semantic_ranking(user_id, q, n)
+            )
+            fused: Dict[str, float] = {}
+            for ranked in (text, semantic):
+                for rank, (key, _) in enumerate(ranked):
+                    fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            ranking = sorted(fused.items(), key=lambda item: -item[1])
+
+        page = ranking[offset:offset + limit]
+        scores = dict(page)
+        docs = {
+            doc["id"]: doc async for doc in
+            self.connections.find({"user_id": user_id, "id": {"$in": list(scores)}}, {**projection, "id": 1})
+        }
+        items = [{**docs[key], "score": round(score, 6)} for key, score in page if key in docs]
+        return items, len(ranking) > offset + limit and offset + limit < SEARCH_MAX_RESULTS
+
+    def stats(self) -> dict:
+        indexes = [entry.index for entry in self._indexes.values() if entry.index is not None]
+        return {
+            "semantic": self.semantic,
+            "model": self.embedder.model_id if self.embedder is not None else None,
+            "pending": len(self._pending),
+            "embedded": self.embedded,
+            "failed_batches": self.failed_batches,
+            "backfill_running": self._backfill is not None and not self._backfill.done(),
+            "loaded_users": len(self._indexes),
+            "loaded_vectors": sum(len(index) for index in indexes),
+            "loaded_bytes": sum(index.nbytes for index in indexes),
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,48 @@
+import re
+from typing import Optional
+
+# Lowercased copies of the searchable profile fields. Anchored regexes on
+# these ("^acme") are answered from an index range, unlike /acme/i.
+SEARCH_FIELDS = {"name": "name_lower", "company": "company_lower", "title": "title_lower"}
+
+# Directory pages stay small so each one is served in bounded time
+DIRECTORY_MAX_PAGE_SIZE = 200
+
+DIRECTORY_SORTS = {
+    "name": [("name_lower", 1), ("id", 1)],
+    "newest": [("created_at", -1), ("id", -1)],
+}
+
+
+def search_fields(profile: dict) -> dict:
+    return {
+        lowered: (profile.get(field) or "").strip().lower()
+        for field, lowered in SEARCH_FIELDS.items()
+    }
+
+
+def directory_query(q: Optional[str] = None, name: Optional[str] = None,
+                    company: Optional[str] = None, title: Optional[str] = None) -> dict:
+    # q is a full-text search over name, company and title (whole words,
+    # stemmed); name/company/title are case-insensitive prefix filters
+    query = {}
+    if q:
+        query["$text"] = {"$search": q}
+    for field, prefix in (("name", name), ("company", company), ("title", title)):
+        prefix = (prefix or "").strip().lower()
+        if prefix:
+            query[SEARCH_FIELDS[field]] = {"$regex": "^" + re.escape(prefix)}
+    return query
+
+
+async def backfill_search_fields(collection) -> int:
+    # Profiles written before the directory existed lack the lowercased
+    # fields; fill them in server-side with one pipeline update
+    result = await collection.update_many(
+        {"name_lower": {"$exists": False}},
+        [{"$set": {
+            lowered: {"$toLower": {"$trim": {"input": {"$ifNull": [f"${field}", ""]}}}}
+            for field, lowered in SEARCH_FIELDS.items()
+        }}]
+    )
+    return result.modified_count
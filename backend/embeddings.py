@@ -0,0 +1,131 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+from external_integrations.http_clients import HTTPClientRegistry
+
+EMBEDDING_BACKENDS = ("none", "cohere", "local")
+
+# input_type values: texts stored in an index vs. the query searched with.
+# Asymmetric models embed them differently.
+DOCUMENT = "search_document"
+QUERY = "search_query"
+
+
+class EmbeddingError(Exception):
+    pass
+
+
+class Embedder:
+    # Turns texts into float32 vectors, one row per text. model_id is stored
+    # with every vector so a model change is never mixed into an old index.
+
+    name = "base"
+    max_batch = 96
+
+    @property
+    def model_id(self) -> str:
+        return self.name
+
+    async def embed(self, texts: List[str], input_type: str = DOCUMENT) -> np.ndarray:
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class CohereEmbedder(Embedder):
+    # Cohere's v2 embed API over the shared "cohere" HTTP client. It takes at
+    # most 96 texts a call, so embed() splits larger inputs.
+
+    name = "cohere"
+
+    def __init__(self, registry: HTTPClientRegistry, api_key: Optional[str], model: str,
+                 endpoint: str = "https://api.cohere.com/v2/embed", client_name: str = "cohere"):
+        self.registry = registry
+        self.api_key = api_key
+        self.model = model
+        self.endpoint = endpoint
+        self.client_name = client_name
+
+    @property
+    def model_id(self) -> str:
+        return f"cohere:{self.model}"
+
+    async def _embed_batch(self, texts: List[str], input_type: str) -> np.ndarray:
+        try:
+            response = await self.registry.get(self.client_name).post(
+                self.endpoint,
+                headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+                json={"model": self.model, "texts": texts, "input_type": input_type, "embedding_types": ["float"]}
+            )
+        except httpx.HTTPError as e:
+            # Timeouts and connection failures, so callers see one error type
+            raise EmbeddingError(f"Embedding request failed ({type(e).__name__})") from e
+        if response.status_code != 200:
+            raise EmbeddingError(f"Embedding request failed ({response.status_code})")
+        return np.asarray(response.json()["embeddings"]["float"], dtype=np.float32)
+
+    async def embed(self, texts: List[str], input_type: str = DOCUMENT) -> np.ndarray:
+        batches = [texts[i:i + self.max_batch] for i in range(0, len(texts), self.max_batch)]
+        return np.vstack(await asyncio.gather(*(self._embed_batch(batch, input_type) for batch in batches)))
+
+
+class LocalEmbedder(Embedder):
+    # A sentence-transformers model on the local CPU, loaded at startup and
+    # run in a worker thread. Optional:
+    #
+    #   pip install sentence-transformers
+
+    name = "local"
+    max_batch = 64
+
+    def __init__(self, model: str = "all-MiniLM-L6-v2", device: str = "cpu"):
+        self.model = model
+        self.device = device
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._model = None
+
+    @property
+    def model_id(self) -> str:
+        return f"local:{self.model}"
+
+    def _load(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError("EMBEDDING_BACKEND=local requires sentence-transformers (pip install sentence-transformers)")
+        return SentenceTransformer(self.model, device=self.device)
+
+    async def start(self):
+        if self._model is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+            self._model = await asyncio.get_running_loop().run_in_executor(self._executor, self._load)
+
+    async def embed(self, texts: List[str], input_type: str = DOCUMENT) -> np.ndarray:
+        await self.start()
+        encode = lambda: self._model.encode(texts, batch_size=self.max_batch, convert_to_numpy=True)
+        vectors = await asyncio.get_running_loop().run_in_executor(self._executor, encode)
+        return vectors.astype(np.float32, copy=False)
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._model = None
+
+
+def vector_to_bytes(vector: np.ndarray) -> bytes:
+    # Stored as raw little-endian float32: a quarter the size of a BSON
+    # array of doubles, and np.frombuffer reads it back without parsing
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def vector_from_bytes(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype="<f4")
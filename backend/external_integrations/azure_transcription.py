@@ -0,0 +1,50 @@
+from typing import BinaryIO, Optional, Union
+
+import httpx
+
+from external_integrations.http_clients import HTTPClientRegistry
+from transcription_backends import TranscriptionBackend, TranscriptionError
+
+
+class AzureTranscriptionClient(TranscriptionBackend):
+    # Async client for the Azure OpenAI transcription deployment. The HTTP/2
+    # pool comes from the shared registry; concurrency and queueing limits
+    # come from TranscriptionBackend.
+
+    name = "azure"
+
+    def __init__(
+        self,
+        registry: HTTPClientRegistry,
+        endpoint: Optional[str],
+        api_key: Optional[str],
+        model: Optional[str],
+        max_concurrency: int = 8,
+        max_waiting: int = 32,
+        acquire_timeout: float = 5.0,
+        client_name: str = "azure_transcription",
+    ):
+        super().__init__(max_concurrency, max_waiting, acquire_timeout)
+        self.registry = registry
+        self.client_name = client_name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.model = model
+
+    async def _transcribe(self, filename: str, audio: Union[bytes, BinaryIO], content_type: Optional[str]) -> str:
+        # A file object is streamed into the multipart body in chunks
+        try:
+            response = await self.registry.get(self.client_name).post(
+                self.endpoint,
+                headers={"api-key": self.api_key},
+                files={"file": (filename, audio, content_type)},
+                data={"model": self.model},
+            )
+        except httpx.TimeoutException:
+            raise TranscriptionError("Transcription request timed out")
+        except httpx.HTTPError as e:
+            raise TranscriptionError(f"Transcription request failed: {e}")
+
+        if response.status_code != 200:
+            raise TranscriptionError("Transcription failed")
+        return response.json().get("text", "")
@@ -0,0 +1,132 @@
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from metrics import UPSTREAM_IN_FLIGHT, record_upstream
+
+
+class TimedTransport(httpx.AsyncBaseTransport):
+    # Records time to response headers per upstream. Wrapping the transport
+    # rather than using event hooks also sees connect errors and timeouts.
+
+    def __init__(self, name: str, wrapped: httpx.AsyncBaseTransport):
+        self.name = name
+        self.wrapped = wrapped
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        UPSTREAM_IN_FLIGHT.inc(upstream=self.name)
+        started = time.perf_counter()
+        try:
+            response = await self.wrapped.handle_async_request(request)
+        except Exception:
+            record_upstream(self.name, request.method, time.perf_counter() - started, error=True)
+            raise
+        finally:
+            UPSTREAM_IN_FLIGHT.dec(upstream=self.name)
+        record_upstream(self.name, request.method, time.perf_counter() - started,
+                        error=response.status_code >= 500)
+        return response
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+class HTTPClientRegistry:
+    # One long-lived httpx.AsyncClient per upstream service, opened at startup
+    # and closed at shutdown, so every call reuses warm keep-alive connections
+    # instead of paying a fresh TCP+TLS handshake.
+
+    def __init__(self):
+        self._configs: Dict[str, dict] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._counters: Dict[str, dict] = {}
+
+    def register(
+        self,
+        name: str,
+        http2: bool = False,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+    ):
+        self._configs[name] = {
+            "http2": http2,
+            "timeout": httpx.Timeout(timeout, connect=connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        }
+        self._counters[name] = {"requests": 0, "responses": 0, "errors": 0}
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        counters = self._counters[name]
+
+        async def on_request(request):
+            counters["requests"] += 1
+
+        async def on_response(response):
+            counters["responses"] += 1
+            if response.status_code >= 500:
+                counters["errors"] += 1
+
+        config = self._configs[name]
+        transport = httpx.AsyncHTTPTransport(http2=config["http2"], limits=config["limits"])
+        return httpx.AsyncClient(
+            timeout=config["timeout"],
+            transport=TimedTransport(name, transport),
+            event_hooks={"request": [on_request], "response": [on_response]},
+        )
+
+    async def start(self):
+        for name in self._configs:
+            if name not in self._clients:
+                self._clients[name] = self._build(name)
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None:
+            if name not in self._configs:
+                raise KeyError(f"Unknown HTTP client: {name}")
+            # Used outside the app lifespan (scripts, tests)
+            client = self._clients[name] = self._build(name)
+        return client
+
+    def set(self, name: str, client: httpx.AsyncClient):
+        # Swap in a preconfigured client, e.g. one with a mock transport
+        self._clients[name] = client
+
+    @staticmethod
+    def _pool_stats(client: Optional[httpx.AsyncClient]) -> dict:
+        transport = getattr(client, "_transport", None)
+        transport = getattr(transport, "wrapped", transport)
+        pool = getattr(transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "available": sum(1 for c in connections if c.is_available()),
+        }
+
+    def stats(self) -> dict:
+        report = {}
+        for name, config in self._configs.items():
+            limits = config["limits"]
+            report[name] = {
+                "open": name in self._clients,
+                "http2": config["http2"],
+                "max_connections": limits.max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+                **self._pool_stats(self._clients.get(name)),
+                **self._counters[name],
+            }
+        return report
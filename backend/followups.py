@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from ai_messages import AIRateLimited
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ["queued", "running"]
+
+# Only what the prompt needs; transcripts are included on purpose
+PROMPT_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "contact_name": 1,
+    "contact_title": 1,
+    "contact_company": 1,
+    "event_name": 1,
+    "event_type": 1,
+    "person_category": 1,
+    "voice_transcript": 1,
+    "notes": 1,
+}
+
+
+class RateLimitGate:
+    # Shared by every worker of a job: one 429 pauses them all until the
+    # upstream's Retry-After has passed.
+
+    def __init__(self):
+        self._resume_at = 0.0
+
+    def pause(self, seconds: float):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def wait(self):
+        while True:
+            delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+
+class FollowUpJobRunner:
+    # Generates ai_message for every connection of a user at an event that
+    # doesn't have one yet. Job state lives in db.followup_jobs; the work
+    # list is simply "connections still missing ai_message", so a job picked
+    # up again after a crash continues where the last flush left off. A lease
+    # keeps two API workers from running the same job. A job is flagged
+    # "active" until it finishes; a partial unique index on that flag keeps
+    # one queued or running job per user and event.
+
+    def __init__(
+        self,
+        db,
+        generate: Callable[[dict], Awaitable[str]],
+        concurrency: int = 4,
+        flush_size: int = 50,
+        max_attempts: int = 5,
+        lease_seconds: float = 60.0,
+    ):
+        self.jobs = db.followup_jobs
+        self.connections = db.connections
+        self.generate = generate
+        self.concurrency = concurrency
+        self.flush_size = flush_size
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def pending_query(user_id: str, event_name: str) -> dict:
+        # ai_message: None matches both null and missing
+        return {"user_id": user_id, "event_name": event_name, "ai_message": None}
+
+    async def create(self, user_id: str, event_name: str) -> dict:
+        # Asking again while a job is queued or running returns that job,
+        # picking it up here if its worker died and the lease ran out
+        while True:
+            existing = await self.jobs.find_one(
+                {"user_id": user_id, "event_name": event_name, "active": True},
+                {"id": 1, "lease_expires_at": 1}
+            )
+            if existing is not None:
+                lease = existing.get("lease_expires_at")
+                if lease is None or lease < datetime.utcnow():
+                    await self.start(existing["id"])
+                return await self.get(existing["id"])
+            job = await self._new_job(user_id, event_name)
+            try:
+                await self.jobs.insert_one(job)
+            except DuplicateKeyError:
+                # Another API worker created it first
+                continue
+            await self.start(job["id"])
+            return await self.get(job["id"])
+
+    async def _new_job(self, user_id: str, event_name: str) -> dict:
+        now = datetime.utcnow()
+        return {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "event_name": event_name,
+            "status": "queued",
+            "active": True,
+            "total": await self.connections.count_documents(self.pending_query(user_id, event_name)),
+            "done": 0,
+            "failed": 0,
+            "failed_ids": [],
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "lease_owner": None,
+            "lease_expires_at": None,
+        }
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.jobs.find_one(
+            {"id": job_id},
+            {"_id": 0, "active": 0, "lease_owner": 0, "lease_expires_at": 0}
+        )
+
+    async def _claim(self, job_id: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.jobs.find_one_and_update(
+            {
+                "id": job_id,
+                "status": {"$in": ACTIVE_STATUSES},
+                "$or": [
+                    {"lease_expires_at": None},
+                    {"lease_expires_at": {"$lt": now}},
+                    {"lease_owner": self.owner},
+                ],
+            },
+            {"$set": {
+                "status": "running",
+                "lease_owner": self.owner,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "updated_at": now,
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def start(self, job_id: str):
+        if job_id in self._tasks:
+            return
+        job = await self._claim(job_id)
+        if job is None:
+            return
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def resume(self):
+        # Called at startup: pick up jobs whose previous owner died
+        async for job in self.jobs.find({"status": {"$in": ACTIVE_STATUSES}}, {"id": 1}):
+            await self.start(job["id"])
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.jobs.update_one(
+                {"id": job_id, "lease_owner": self.owner},
+                {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+            )
+
+    async def _generate(self, connection: dict, gate: RateLimitGate) -> str:
+        for attempt in range(self.max_attempts):
+            await gate.wait()
+            try:
+                return await self.generate(connection)
+            except AIRateLimited as e:
+                gate.pause(e.retry_after)
+            except Exception:
+                if attempt == self.max_attempts - 1:
+                    raise
+                await asyncio.sleep(min(2 ** attempt, 30))
+        raise RuntimeError("Still rate limited after retries")
+
+    async def _run(self, job: dict):
+        job_id = job["id"]
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        gate = RateLimitGate()
+        slots = asyncio.Semaphore(self.concurrency)
+        writes = []
+        failed_ids = []
+        flush_lock = asyncio.Lock()
+        in_flight = set()
+
+        async def flush():
+            async with flush_lock:
+                ops, failed = writes[:], failed_ids[:]
+                writes.clear()
+                failed_ids.clear()
+                if ops:
+                    await self.connections.bulk_write(ops, ordered=False)
+                if ops or failed:
+                    await self.jobs.update_one(
+                        {"id": job_id},
+                        {
+                            "$inc": {"done": len(ops), "failed": len(failed)},
+                            "$push": {"failed_ids": {"$each": failed, "$slice": -100}},
+                            "$set": {"updated_at": datetime.utcnow()},
+                        }
+                    )
+
+        async def process(connection: dict):
+            try:
+                message = await self._generate(connection, gate)
+            except Exception as e:
+                logger.warning("Follow-up generation failed for connection %s: %s", connection["id"], e)
+                failed_ids.append(connection["id"])
+            else:
+                # Guard on ai_message so a message written meanwhile is kept
+                writes.append(UpdateOne(
+                    {"id": connection["id"], "ai_message": None},
+                    {"$set": {"ai_message": message}}
+                ))
+            finally:
+                slots.release()
+            if len(writes) >= self.flush_size:
+                await flush()
+
+        try:
+            cursor = self.connections.find(
+                self.pending_query(job["user_id"], job["event_name"]),
+                PROMPT_PROJECTION
+            )
+            async for connection in cursor:
+                await slots.acquire()
+                task = asyncio.create_task(process(connection))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            await asyncio.gather(*in_flight)
+            await flush()
+            await self.jobs.update_one(
+                {"id": job_id},
+                {
+                    "$set": {
+                        "status": "done",
+                        "updated_at": datetime.utcnow(),
+                        "lease_owner": None,
+                        "lease_expires_at": None,
+                    },
+                    "$unset": {"active": ""},
+                }
+            )
+        except asyncio.CancelledError:
+            # Shutdown: save progress and release the lease so the job resumes
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            await flush()
+            await self.jobs.update_one(
+                {"id": job_id, "lease_owner": self.owner},
+                {"$set": {"lease_owner": None, "lease_expires_at": None, "updated_at": datetime.utcnow()}}
+            )
+            raise
+        except Exception as e:
+            logger.exception("Follow-up job %s failed", job_id)
+            await self.jobs.update_one(
+                {"id": job_id},
+                {
+                    "$set": {
+                        "status": "failed",
+                        "error": str(e),
+                        "updated_at": datetime.utcnow(),
+                        "lease_owner": None,
+                        "lease_expires_at": None,
+                    },
+                    "$unset": {"active": ""},
+                }
+            )
+        finally:
+            heartbeat.cancel()
@@ -0,0 +1,133 @@
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Every query shape used by server.py should be covered here. Index names are
+# fixed so a changed definition shows up as a conflict instead of a silent
+# second index.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "profiles": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Directory: alphabetical and newest-first keyset pages, prefix
+        # filters on the lowercased fields, full-text q
+        IndexModel([("name_lower", ASCENDING), ("id", ASCENDING)], name="name_lower_id"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("company_lower", ASCENDING), ("name_lower", ASCENDING), ("id", ASCENDING)],
+            name="company_lower_name"
+        ),
+        IndexModel(
+            [("title_lower", ASCENDING), ("name_lower", ASCENDING), ("id", ASCENDING)],
+            name="title_lower_name"
+        ),
+        IndexModel(
+            [("name", TEXT), ("company", TEXT), ("title", TEXT)],
+            name="directory_text",
+            weights={"name": 5, "company": 2, "title": 1}
+        ),
+    ],
+    "connections": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # get_user_connections: filter by user, keyset order (created_at, id)
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="user_created_at"
+        ),
+        # Bulk QR badges by event: distinct user_id for an event_name
+        IndexModel([("event_name", ASCENDING), ("user_id", ASCENDING)], name="event_user"),
+        # Follow-up batches: a user's connections at one event
+        IndexModel([("user_id", ASCENDING), ("event_name", ASCENDING)], name="user_event"),
+        # Connection search: keywords within one user's connections
+        IndexModel(
+            [("user_id", ASCENDING), ("contact_name", TEXT), ("contact_company", TEXT),
+             ("notes", TEXT), ("voice_transcript", TEXT)],
+            name="user_search_text",
+            weights={"contact_name": 5, "contact_company": 3, "notes": 2, "voice_transcript": 1}
+        ),
+        # Bulk ingest replays: one document per client-supplied key
+        IndexModel(
+            [("user_id", ASCENDING), ("idempotency_key", ASCENDING)],
+            name="user_idempotency_key",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}}
+        ),
+    ],
+    "connection_embeddings": [
+        # Semantic search: load a user's vectors, then what changed since
+        IndexModel(
+            [("user_id", ASCENDING), ("model", ASCENDING), ("updated_at", ASCENDING)],
+            name="user_model_updated_at"
+        ),
+    ],
+    "profile_embeddings": [
+        # Recommender: load vectors for the current model, then what changed
+        IndexModel([("model", ASCENDING), ("updated_at", ASCENDING)], name="model_updated_at"),
+    ],
+    "connection_stats": [
+        # Analytics rollups: one event's rows, and events by total
+        IndexModel([("event_name", ASCENDING), ("dimension", ASCENDING)], name="event_dimension"),
+        IndexModel([("dimension", ASCENDING), ("total", DESCENDING)], name="dimension_total"),
+    ],
+    "ai_message_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "followup_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING)], name="status"),
+        # One queued or running job per user and event
+        IndexModel(
+            [("user_id", ASCENDING), ("event_name", ASCENDING)],
+            name="user_event_active",
+            unique=True,
+            partialFilterExpression={"active": True}
+        ),
+    ],
+    "transcription_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Worker claim: oldest queued job, or a processing job whose lease lapsed
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "qr_codes": [
+        # Eviction of a user's older images per format and payload kind
+        IndexModel(
+            [("user_id", ASCENDING), ("format", ASCENDING), ("payload", ASCENDING)],
+            name="user_format_payload"
+        ),
+    ],
+}
+
+
+class IndexConflict(Exception):
+    pass
+
+
+async def ensure_indexes(db, specs: Dict[str, List[IndexModel]] = INDEXES) -> dict:
+    # create_indexes is a no-op for indexes that already exist with the same
+    # definition; a mismatch (or duplicate data under a unique index) raises,
+    # and we refuse to start rather than serve with a collection scan.
+    report = {}
+    for collection_name, models in specs.items():
+        collection = db[collection_name]
+        try:
+            await collection.create_indexes(models)
+        except OperationFailure as e:
+            raise IndexConflict(f"{collection_name}: {e}") from e
+
+        existing = await collection.index_information()
+        expected = {model.document["name"] for model in models}
+        report[collection_name] = {
+            "ensured": sorted(expected),
+            "unmanaged": sorted(set(existing) - expected - {"_id_"}),
+        }
+        logger.info(
+            "Indexes on %s: ensured=%s unmanaged=%s",
+            collection_name,
+            report[collection_name]["ensured"],
+            report[collection_name]["unmanaged"],
+        )
+    return report
@@ -0,0 +1,246 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # pymongo's listener runs on motor's executor threads
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_label_text(self.labelnames, key)} {value:g}"
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+            lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., count, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += 1
+            series[-1] += value
+
+    def _samples(self):
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _label_text(self.labelnames, key, 'le="%g"' % bound)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _label_text(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {series[-2]}"
+            yield f"{self.name}_count{_label_text(self.labelnames, key)} {series[-2]}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-1]:g}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route.", ("method", "route")
+))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "http_requests_total", "Requests served, by route and status.", ("method", "route", "status")
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served.", ("method",)
+))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "upstream_duration_seconds", "Time spent in MongoDB, QR rendering and outbound HTTP calls.",
+    ("upstream", "operation")
+))
+UPSTREAM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "upstream_in_flight", "Upstream calls currently in progress.", ("upstream",)
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "upstream_errors_total", "Upstream calls that raised or returned a 5xx.", ("upstream", "operation")
+))
+
+
+class RequestTiming:
+    # Per-request totals for the Server-Timing header
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.upstreams: Dict[str, list] = {}
+
+    def add(self, upstream: str, seconds: float):
+        with self._lock:
+            entry = self.upstreams.setdefault(upstream, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def header(self) -> str:
+        with self._lock:
+            parts = [
+                f'{name};dur={total * 1000:.1f};desc="{count}x"'
+                for name, (total, count) in self.upstreams.items()
+            ]
+        parts.append(f"app;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def record_upstream(upstream: str, operation: str, seconds: float, error: bool = False):
+    UPSTREAM_SECONDS.observe(seconds, upstream=upstream, operation=operation)
+    if error:
+        UPSTREAM_ERRORS.inc(upstream=upstream, operation=operation)
+    timing = _request_timing.get()
+    if timing is not None:
+        timing.add(upstream, seconds)
+
+
+@contextmanager
+def timed(upstream: str, operation: str = ""):
+    UPSTREAM_IN_FLIGHT.inc(upstream=upstream)
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(upstream=upstream)
+        record_upstream(upstream, operation, time.perf_counter() - started, error=error)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    # Registered on the Mongo client. Motor copies the calling task's context
+    # onto its executor threads, so durations land on the right request.
+
+    def started(self, event):
+        UPSTREAM_IN_FLIGHT.inc(upstream="mongo")
+
+    def succeeded(self, event):
+        UPSTREAM_IN_FLIGHT.dec(upstream="mongo")
+        record_upstream("mongo", event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        UPSTREAM_IN_FLIGHT.dec(upstream="mongo")
+        record_upstream("mongo", event.command_name, event.duration_micros / 1e6, error=True)
+
+
+class MetricsMiddleware:
+    # Pure ASGI so streaming responses are timed end to end. The route label
+    # is the matched path template ("/api/profile/{user_id}"), read after the
+    # router has run, to keep label cardinality bounded.
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        timing = RequestTiming()
+        token = _request_timing.set(timing)
+        status = 500
+        REQUESTS_IN_FLIGHT.inc(method=method)
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timing.header().encode()))
+                    # Lets cross-origin pages read it through the Performance API
+                    headers.append((b"timing-allow-origin", b"*"))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - timing.started, method=method, route=route)
+            REQUESTS_TOTAL.inc(method=method, route=route, status=str(status))
+            REQUESTS_IN_FLIGHT.dec(method=method)
+            _request_timing.reset(token)
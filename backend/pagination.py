@@ -0,0 +1,100 @@
+import base64
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from serialization import dumps
+
+MAX_PAGE_SIZE = 1000
+
+# Keyset order for listings: newest first, id breaks ties between documents
+# created in the same millisecond.
+KEYSET_SORT = [("created_at", -1), ("id", -1)]
+
+
+def _cursor_value(value):
+    return {"$date": value.isoformat()} if isinstance(value, datetime) else value
+
+
+def _restore_value(value):
+    return datetime.fromisoformat(value["$date"]) if isinstance(value, dict) else value
+
+
+def encode_cursor(doc: dict, sort: List[Tuple[str, int]] = KEYSET_SORT) -> str:
+    raw = json.dumps({field: _cursor_value(doc.get(field)) for field, _ in sort})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: List[Tuple[str, int]] = KEYSET_SORT) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # A cursor from a differently sorted listing is rejected
+        if list(values) != [field for field, _ in sort]:
+            raise ValueError("cursor does not match the sort")
+        return [_restore_value(value) for value in values.values()]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(query: dict, cursor: Optional[str], sort: List[Tuple[str, int]] = KEYSET_SORT) -> dict:
+    # Documents strictly after the cursor in sort order: for (a, b) that is
+    # a past the cursor's a, or the same a and b past the cursor's b
+    if not cursor:
+        return query
+    values = decode_cursor(cursor, sort)
+    branches = []
+    for index, (field, direction) in enumerate(sort):
+        branch = {f: values[i] for i, (f, _) in enumerate(sort[:index])}
+        branch[field] = {"$lt" if direction < 0 else "$gt": values[index]}
+        branches.append(branch)
+    after = {"$or": branches}
+    return {"$and": [query, after]} if query else after
+
+
+def projection_for(fields: Optional[str], allowed: Iterable[str]) -> Optional[dict]:
+    # Sparse fieldsets; id and created_at are always kept for the cursor
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    projection = {"_id": 0, "id": 1, "created_at": 1}
+    projection.update({f: 1 for f in requested})
+    return projection
+
+
+async def fetch_page(collection, query: dict, cursor: Optional[str], limit: int,
+                     projection: Optional[dict] = None,
+                     sort: List[Tuple[str, int]] = KEYSET_SORT) -> Tuple[List[dict], Optional[str]]:
+    # Sort keys the projection leaves out are fetched for the cursor and
+    # dropped again before returning
+    projection = dict(projection or {"_id": 0})
+    hidden = []
+    if any(value == 1 for value in projection.values()):
+        hidden = [field for field, _ in sort if field not in projection]
+        projection.update({field: 1 for field in hidden})
+
+    # Fetch one extra document to learn whether another page exists
+    docs = await collection.find(
+        keyset_filter(query, cursor, sort), projection
+    ).sort(sort).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+    for doc in docs:
+        for field in hidden:
+            doc.pop(field, None)
+    return docs, next_cursor
+
+
+async def ndjson_lines(collection, query: dict, cursor: Optional[str] = None,
+                       projection: Optional[dict] = None, batch_size: int = 500) -> AsyncIterator[bytes]:
+    async for doc in collection.find(
+        keyset_filter(query, cursor), projection or {"_id": 0}
+    ).sort(KEYSET_SORT).batch_size(batch_size):
+        yield dumps(doc) + b"\n"
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional
+
+from caching import LRUCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "profile-invalidations"
+
+
+def _encode(profile: dict) -> str:
+    return json.dumps(profile, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+
+
+def _decode(raw) -> dict:
+    profile = json.loads(raw)
+    if isinstance(profile.get("created_at"), str):
+        profile["created_at"] = datetime.fromisoformat(profile["created_at"])
+    return profile
+
+
+class LocalSharedStore:
+    # Stand-in for Redis with the same interface: values and pub/sub live in
+    # this process only. For development and tests; with several uvicorn
+    # workers use RedisSharedStore.
+
+    def __init__(self):
+        self._values: Dict[str, tuple] = {}
+        self._subscribers = set()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._values[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def publish(self, channel: str, message: str):
+        for queue in list(self._subscribers):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.discard(queue)
+
+    async def close(self):
+        self._values.clear()
+
+
+class RedisSharedStore:
+    # Shared by every worker that points at the same Redis. redis is an
+    # optional dependency, imported only when this store is used.
+
+    def __init__(self, url: str, prefix: str = "letsconnect:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("PROFILE_CACHE_SHARED=redis requires redis (pip install redis)")
+        self.prefix = prefix
+        self.client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def publish(self, channel: str, message: str):
+        await self.client.publish(self.prefix + channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.prefix + channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class ProfileCache:
+    # Read-through cache for profile lookups by id. A per-process LRU answers
+    # hot reads (badge scans) without a round-trip. An optional shared store
+    # sits between it and MongoDB; writes go through put()/invalidate(),
+    # which also tell the other workers to drop their local copy. Concurrent
+    # misses for the same id share one MongoDB read.
+    #
+    # Returned dicts are copies and may be modified by the caller.
+
+    def __init__(self, collection, max_entries: int = 4096, ttl: float = 300.0,
+                 local_ttl: Optional[float] = None, shared=None):
+        self.collection = collection
+        self.ttl = ttl
+        self.local = LRUCache(max_entries, ttl=local_ttl if local_ttl is not None else ttl)
+        self.shared = shared
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self.invalidations = 0
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        profile = self.local.get(user_id)
+        if profile is None:
+            task = self._loading.get(user_id)
+            if task is None:
+                task = self._loading[user_id] = asyncio.ensure_future(self._load(user_id))
+                task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+            # Shielded so one caller going away doesn't fail the others
+            profile = await asyncio.shield(task)
+        return dict(profile) if profile is not None else None
+
+    async def _load(self, user_id: str) -> Optional[dict]:
+        if self.shared is not None:
+            raw = await self.shared.get(user_id)
+            if raw is not None:
+                profile = _decode(raw)
+                self.local.set(user_id, profile)
+                return profile
+        profile = await self.collection.find_one({"id": user_id}, {"_id": 0})
+        if profile is not None:
+            await self._store(profile)
+        return profile
+
+    async def _store(self, profile: dict):
+        self.local.set(profile["id"], profile)
+        if self.shared is not None:
+            await self.shared.set(profile["id"], _encode(profile), self.ttl)
+
+    async def put(self, profile: dict):
+        # Write-through after a profile is created or changed
+        profile = {k: v for k, v in profile.items() if k != "_id"}
+        await self._store(profile)
+        await self._broadcast(profile["id"])
+
+    async def invalidate(self, user_id: str):
+        self.local.pop(user_id)
+        if self.shared is not None:
+            await self.shared.delete(user_id)
+        await self._broadcast(user_id)
+
+    async def _broadcast(self, user_id: str):
+        if self.shared is not None:
+            await self.shared.publish(INVALIDATION_CHANNEL, user_id)
+
+    async def start(self):
+        if self.shared is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                async for user_id in self.shared.subscribe(INVALIDATION_CHANNEL):
+                    # Our own broadcasts come back too; the entry may be fresh
+                    # then, but dropping it only costs one shared-store read
+                    self.local.pop(user_id)
+                    self.invalidations += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Profile invalidation feed failed, retrying: %s", e)
+                await asyncio.sleep(1.0)
+            # Messages may have been missed while disconnected
+            self.local.clear()
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self.shared is not None:
+            await self.shared.close()
+
+    def stats(self) -> dict:
+        return {
+            "local": self.local.stats(),
+            "shared": type(self.shared).__name__ if self.shared is not None else None,
+            "loading": len(self._loading),
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,176 @@
+import asyncio
+import io
+import os
+import re
+import tempfile
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from PIL import Image
+
+from qr_codes import QRBusy
+
+
+def _badge_filename(profile: dict, image_format: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", profile.get("name") or "").strip("-").lower()
+    return f"{slug or 'profile'}-{profile['id']}.{image_format}"
+
+
+def _build_pdf(pngs: List[bytes], path: str):
+    # One page per badge; pages are decoded one at a time as PIL appends them
+    pages = (Image.open(io.BytesIO(png)).convert("1") for png in pngs)
+    first = next(pages)
+    first.save(path, format="PDF", save_all=True, append_images=pages, resolution=300)
+
+
+class QRBatchJob:
+    def __init__(self, output: str, image_format: str, total: int, payload: str = "profile"):
+        self.id = str(uuid.uuid4())
+        self.output = output
+        self.image_format = image_format
+        self.payload = payload
+        self.status = "queued"
+        self.total = total
+        self.done = 0
+        self.failed: List[str] = []
+        self.error: Optional[str] = None
+        self.path: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def media_type(self) -> str:
+        return "application/pdf" if self.output == "pdf" else "application/zip"
+
+    @property
+    def filename(self) -> str:
+        return f"qr-badges-{self.id}.{self.output}"
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "output": self.output,
+            "image_format": self.image_format,
+            "payload": self.payload,
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "progress": round(self.done / self.total, 4) if self.total else 1.0,
+            "error": self.error,
+            "created_at": self.created_at,
+        }
+
+
+class QRBatchRunner:
+    # Renders badge QR codes for many profiles in the background and packs
+    # them into a ZIP (or a one-page-per-badge PDF) on local disk. Rendering
+    # goes through the shared QR render pool with bounded concurrency so
+    # interactive /qr-code requests still get workers. A badge that can't get
+    # a render slot within busy_timeout seconds is recorded as failed. Jobs
+    # live in this process; finished archives are removed after `retention`
+    # seconds.
+
+    def __init__(
+        self,
+        render: Callable[[dict, str, str], Awaitable[bytes]],
+        concurrency: int = 8,
+        retention: float = 3600.0,
+        work_dir: Optional[str] = None,
+        busy_timeout: float = 30.0,
+    ):
+        self.render = render
+        self.concurrency = concurrency
+        self.retention = retention
+        self.busy_timeout = busy_timeout
+        self.work_dir = work_dir or tempfile.gettempdir()
+        self.jobs: Dict[str, QRBatchJob] = {}
+
+    def submit(self, profiles: List[dict], output: str = "zip", image_format: str = "png",
+               payload: str = "profile") -> QRBatchJob:
+        self.cleanup()
+        job = QRBatchJob(output, image_format, len(profiles), payload)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, profiles))
+        return job
+
+    def get(self, job_id: str) -> Optional[QRBatchJob]:
+        return self.jobs.get(job_id)
+
+    async def _render_one(self, profile: dict, image_format: str, payload: str) -> bytes:
+        deadline = time.monotonic() + self.busy_timeout
+        while True:
+            try:
+                return await self.render(profile, image_format, payload)
+            except QRBusy:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(0.05)
+
+    async def _run(self, job: QRBatchJob, profiles: List[dict]):
+        job.status = "running"
+        slots = asyncio.Semaphore(self.concurrency)
+        results: List[Optional[bytes]] = [None] * len(profiles)
+
+        async def render(index: int, profile: dict):
+            async with slots:
+                try:
+                    results[index] = await self._render_one(profile, job.image_format, job.payload)
+                except Exception:
+                    job.failed.append(profile["id"])
+                job.done += 1
+
+        try:
+            fd, job.path = tempfile.mkstemp(prefix="qr-badges-", suffix=f".{job.output}", dir=self.work_dir)
+            os.close(fd)
+            await asyncio.gather(*(render(i, p) for i, p in enumerate(profiles)))
+            rendered = [(p, r) for p, r in zip(profiles, results) if r is not None]
+            if job.output == "pdf" and not rendered:
+                raise ValueError("No QR codes were rendered")
+            loop = asyncio.get_running_loop()
+            if job.output == "pdf":
+                await loop.run_in_executor(None, _build_pdf, [r for _, r in rendered], job.path)
+            else:
+                await loop.run_in_executor(None, self._build_zip, rendered, job.image_format, job.path)
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.monotonic()
+
+    @staticmethod
+    def _build_zip(rendered, image_format: str, path: str):
+        # PNGs are already compressed, so only SVG text is worth deflating
+        compression = zipfile.ZIP_DEFLATED if image_format == "svg" else zipfile.ZIP_STORED
+        with zipfile.ZipFile(path, "w", compression=compression) as archive:
+            for profile, image in rendered:
+                archive.writestr(_badge_filename(profile, image_format), image)
+
+    def _discard(self, job: QRBatchJob):
+        self.jobs.pop(job.id, None)
+        if job.path and os.path.exists(job.path):
+            os.remove(job.path)
+
+    def cleanup(self):
+        now = time.monotonic()
+        for job in list(self.jobs.values()):
+            if job.finished_at is not None and now - job.finished_at > self.retention:
+                self._discard(job)
+
+    async def close(self):
+        for job in list(self.jobs.values()):
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+                try:
+                    await job.task
+                except asyncio.CancelledError:
+                    pass
+            self._discard(job)
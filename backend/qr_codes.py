@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import io
+import json
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+import qrcode
+from bson import Binary
+
+from caching import LRUCache
+from metrics import timed
+
+# Bump when the rendering below changes so cached images are not reused
+QR_RENDER_VERSION = "v2:box=10:border=5"
+
+QR_IMAGE_FORMATS = ("png", "svg")
+QR_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def qr_payload(profile: dict) -> str:
+    qr_data = {
+        "id": profile["id"],
+        "name": profile["name"],
+        "linkedin_url": profile.get("linkedin_url"),
+        "email": profile.get("email"),
+        "title": profile.get("title"),
+        "company": profile.get("company")
+    }
+    return json.dumps(qr_data)
+
+
+def qr_digest(payload: str, image_format: str = "png") -> str:
+    key = f"{QR_RENDER_VERSION}:{image_format}\n{payload}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _svg_from_matrix(matrix) -> bytes:
+    # One path of horizontal runs in module units; a fraction of the size of
+    # qrcode's per-module SVG output and scales cleanly to any print size.
+    size = len(matrix)
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                runs.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges"><rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(runs)}"/></svg>'
+    ).encode()
+
+
+def render_qr(payload: str, image_format: str = "png") -> bytes:
+    # Module-level so it can be pickled into a process pool
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    if image_format == "svg":
+        return _svg_from_matrix(qr.get_matrix())
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class QRBusy(Exception):
+    pass
+
+
+class QRRenderPool:
+    # Runs render_qr off the event loop. Processes sidestep the GIL for the
+    # pure-Python matrix build; threads are available where forking is not.
+    # max_pending bounds the backlog so a burst fails fast instead of queueing
+    # without limit.
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 64, kind: str = "process"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    def start(self):
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="qr-render")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def close(self):
+        if self._executor is not None:
+            # Join the workers before the executor's pipes are torn down;
+            # not waiting can hit EBADF in concurrent.futures at exit
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, payload: str, image_format: str = "png") -> bytes:
+        if self._pending >= self.max_pending:
+            raise QRBusy("Too many QR codes waiting to render")
+        self.start()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            with timed("qr_render", image_format):
+                return await loop.run_in_executor(self._executor, render_qr, payload, image_format)
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+        }
+
+
+class QRCodeCache:
+    # Content-addressed cache of rendered QR images keyed by qr_digest().
+    # A bounded in-memory LRU sits in front of an optional MongoDB collection
+    # that survives restarts and is shared between workers. A profile edit
+    # changes the digest, so stale images are never served; the Mongo tier
+    # also drops a user's older images of the same format and payload kind
+    # when a new one is stored.
+
+    def __init__(self, max_entries: int = 1024, collection=None):
+        self.memory = LRUCache(max_entries)
+        self.collection = collection
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        image = self.memory.get(digest)
+        if image is not None or self.collection is None:
+            return image
+        doc = await self.collection.find_one({"_id": digest}, {"image": 1})
+        if doc is None:
+            return None
+        image = bytes(doc["image"])
+        self.memory.set(digest, image)
+        return image
+
+    async def set(self, digest: str, user_id: str, image_format: str, image: bytes, payload: str = "profile"):
+        self.memory.set(digest, image)
+        if self.collection is None:
+            return
+        await self.collection.update_one(
+            {"_id": digest},
+            {"$set": {
+                "user_id": user_id,
+                "format": image_format,
+                "payload": payload,
+                "image": Binary(image),
+                "created_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        # Images stored before the payload kind was recorded are profile ones
+        kind = {"$in": [payload, None]} if payload == "profile" else payload
+        await self.collection.delete_many(
+            {"user_id": user_id, "format": image_format, "payload": kind, "_id": {"$ne": digest}}
+        )
+
+    def stats(self) -> dict:
+        return {"memory": self.memory.stats(), "mongo_tier": self.collection is not None}
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from bson.binary import Binary
+from pymongo import ReplaceOne
+
+from embeddings import DOCUMENT, Embedder, vector_from_bytes, vector_to_bytes
+from vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_MAX = 50
+
+# How many of a user's most frequent connection categories go into their
+# profile text ("Meets: Investor, Mentor")
+TOP_CATEGORIES = 3
+
+# Embeddings written by other workers are picked up by updated_at; the
+# overlap covers clock skew between them
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+TOP_CATEGORIES_PIPELINE = [
+    {"$group": {"_id": {"user_id": "$user_id", "category": "$person_category"}, "count": {"$sum": 1}}},
+    {"$sort": {"count": -1}},
+    {"$group": {"_id": "$_id.user_id", "categories": {"$push": "$_id.category"}}},
+]
+
+
+def profile_text(profile: dict, categories: Optional[List[str]] = None) -> str:
+    parts = [profile.get("title"), profile.get("company") and f"at {profile['company']}"]
+    text = " ".join(part.strip() for part in parts if part and part.strip())
+    if categories:
+        text += "\nMeets: " + ", ".join(categories[:TOP_CATEGORIES])
+    return text or profile.get("name", "")
+
+
+class ProfileRecommender:
+    # "Who should I meet": the profiles closest to a user's own in embedding
+    # space. Every profile's vector is kept in one in-memory VectorIndex, so
+    # a request is one matrix-vector product over the attendees rather than
+    # a pairwise comparison. Vectors are stored in profile_embeddings
+    # (float32 bytes) and loaded at startup; profiles without one for the
+    # current model are embedded in batches in the background. New profiles
+    # are queued by add() and join the index as soon as their batch is
+    # embedded; other workers' additions arrive via a periodic refresh.
+
+    def __init__(self, profiles, embeddings, connections, embedder: Embedder,
+                 refresh_interval: float = 10.0, batch_delay: float = 0.5):
+        self.profiles = profiles
+        self.embeddings = embeddings
+        self.connections = connections
+        self.embedder = embedder
+        self.refresh_interval = refresh_interval
+        self.batch_delay = batch_delay
+        self.index: Optional[VectorIndex] = None
+        self._loaded_through: Optional[datetime] = None
+        self._pending: Dict[str, dict] = {}
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._rebuild: Optional[asyncio.Task] = None
+        self.embedded = 0
+        self.failed_batches = 0
+
+    def add(self, profile: dict):
+        self._pending[profile["id"]] = profile
+        self._wake.set()
+
+    async def start(self):
+        if self._tasks:
+            return
+        await self.embedder.start()
+        await self._refresh()
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._refresh_loop())]
+        self.rebuild(missing_only=True)
+
+    async def close(self):
+        for task in self._tasks + [self._rebuild]:
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._tasks = []
+        self._rebuild = None
+
+    async def _refresh(self):
+        # First call loads every vector; later calls only what changed
+        query = {"model": self.embedder.model_id}
+        if self._loaded_through is not None:
+            query["updated_at"] = {"$gte": self._loaded_through - REFRESH_OVERLAP}
+        self._loaded_through = datetime.utcnow()
+        ids, vectors = [], []
+        async for doc in self.embeddings.find(query, {"vector": 1}).batch_size(5000):
+            ids.append(doc["_id"])
+            vectors.append(vector_from_bytes(doc["vector"]))
+        if vectors:
+            self._upsert(ids, np.vstack(vectors))
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self._refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Profile embedding refresh failed: %s", e)
+
+    def _upsert(self, ids: List[str], vectors: np.ndarray):
+        if self.index is None:
+            self.index = VectorIndex(vectors.shape[1], capacity=max(1024, len(ids)))
+        self.index.upsert(ids, vectors)
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.batch_delay)
+            self._wake.clear()
+            while self._pending:
+                ids = list(self._pending)[:self.embedder.max_batch]
+                batch = [self._pending.pop(key) for key in ids]
+                try:
+                    await self._embed_and_store(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("Embedding %s profiles failed, retrying: %s", len(batch), e)
+                    self.failed_batches += 1
+                    for profile in batch:
+                        self._pending.setdefault(profile["id"], profile)
+                    await asyncio.sleep(5.0)
+
+    async def _embed_and_store(self, profiles: List[dict], categories: Optional[Dict[str, List[str]]] = None):
+        categories = categories or {}
+        texts = [profile_text(profile, categories.get(profile["id"])) for profile in profiles]
+        vectors = await self.embedder.embed(texts, DOCUMENT)
+        now = datetime.utcnow()
+        await self.embeddings.bulk_write([
+            ReplaceOne({"_id": profile["id"]}, {
+                "_id": profile["id"],
+                "model": self.embedder.model_id,
+                "vector": Binary(vector_to_bytes(vector)),
+                "updated_at": now,
+            }, upsert=True)
+            for profile, vector in zip(profiles, vectors)
+        ], ordered=False)
+        self._upsert([profile["id"] for profile in profiles], vectors)
+        self.embedded += len(profiles)
+
+    def rebuild(self, missing_only: bool = False) -> bool:
+        # Batch precompute: re-embeds every profile with its current
+        # connection categories (or just those without a vector). Runs in
+        # the background; returns False if one is already running.
+        if self._rebuild is not None and not self._rebuild.done():
+            return False
+        self._rebuild = asyncio.create_task(self._run_rebuild(missing_only))
+        return True
+
+    async def _run_rebuild(self, missing_only: bool):
+        try:
+            await self._precompute(missing_only)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Profile embedding rebuild failed")
+
+    async def _precompute(self, missing_only: bool):
+        done = set()
+        if missing_only:
+            async for doc in self.embeddings.find({"model": self.embedder.model_id}, {"_id": 1}):
+                done.add(doc["_id"])
+        categories = {
+            doc["_id"]: doc["categories"]
+            async for doc in self.connections.aggregate(TOP_CATEGORIES_PIPELINE, allowDiskUse=True)
+        }
+        batch = []
+        async for profile in self.profiles.find({}, {"_id": 0, "id": 1, "name": 1, "title": 1, "company": 1}):
+            if profile["id"] in done:
+                continue
+            batch.append(profile)
+            if len(batch) == self.embedder.max_batch:
+                await self._embed_and_store(batch, categories)
+                batch = []
+        if batch:
+            await self._embed_and_store(batch, categories)
+        logger.info("Profile embeddings up to date (%s embedded so far)", self.embedded)
+
+    async def recommend(self, user_id: str, limit: int = 10,
+                        event_name: Optional[str] = None) -> Optional[List[Tuple[str, float]]]:
+        # (user id, similarity) pairs, best first; None if the user has no
+        # vector yet. event_name limits matches to people with connections
+        # logged at that event.
+        vector = self.index.vector(user_id) if self.index is not None else None
+        if vector is None:
+            return None
+        within = None
+        if event_name:
+            within = await self.connections.distinct("user_id", {"event_name": event_name})
+        return self.index.search(vector, limit, exclude=[user_id], within=within)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.embedder.model_id,
+            "profiles": len(self.index) if self.index is not None else 0,
+            "bytes": self.index.nbytes if self.index is not None else 0,
+            "pending": len(self._pending),
+            "embedded": self.embedded,
+            "failed_batches": self.failed_batches,
+            "rebuild_running": self._rebuild is not None and not self._rebuild.done(),
+        }
@@ -0,0 +1,49 @@
+import json
+from typing import Dict, List, Type
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+    ORJSONResponse = None
+
+# Default response class for the app. orjson serializes datetimes and
+# large lists several times faster than json + jsonable_encoder.
+FastJSONResponse = ORJSONResponse or JSONResponse
+
+_defaults: Dict[type, dict] = {}
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(jsonable_encoder(content)).encode()
+
+
+def model_projection(model: Type[BaseModel]) -> dict:
+    # Mongo projection with exactly the model's fields, so raw documents have
+    # the response shape without a model round-trip
+    projection = {"_id": 0}
+    projection.update({name: 1 for name in model.model_fields})
+    return projection
+
+
+def raw_documents(docs: List[dict], model: Type[BaseModel]) -> List[dict]:
+    # Read fast path: documents were validated when they were written, so
+    # only fill in optional fields that older documents may lack
+    defaults = _defaults.get(model)
+    if defaults is None:
+        defaults = _defaults[model] = {
+            name: field.default for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+    for doc in docs:
+        for name, default in defaults.items():
+            if name not in doc:
+                doc[name] = default
+    return docs
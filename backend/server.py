@@ -1,34 +1,80 @@
-from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, Form, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from pydantic import ValidationError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Tuple
 import uuid
 from datetime import datetime
-import qrcode
-import io
+import asyncio
 import base64
-import json
-import httpx
-import cohere
+import tempfile
 from urllib.parse import urlencode
-import requests
+from ai_messages import (
+    AIMessageCache,
+    AIRateLimited,
+    build_chat_payload,
+    prompt_fingerprint,
+    sse_event,
+)
+from ai_providers import (
+    AIProviderChain,
+    AIReply,
+    AzureOpenAIProvider,
+    CohereProvider,
+    TemplateProvider,
+)
+from connection_search import SEARCH_MAX_RESULTS, SEARCH_MODES, SEARCH_TEXT_FIELDS, ConnectionSearch
+from connection_feed import ConnectionFeed, FeedFull, pump_websocket, sse_frame
+from analytics import ConnectionAnalytics
+from audio_segments import audio_suffix, ffmpeg_path, split_audio
+from external_integrations.azure_transcription import AzureTranscriptionClient
+from external_integrations.http_clients import HTTPClientRegistry
+from embeddings import CohereEmbedder, EmbeddingError, LocalEmbedder
+from directory import (
+    DIRECTORY_MAX_PAGE_SIZE,
+    DIRECTORY_SORTS,
+    backfill_search_fields,
+    directory_query,
+    search_fields,
+)
+from followups import FollowUpJobRunner
+from indexes import ensure_indexes
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, MetricsMiddleware, MongoCommandTimer
+from pagination import MAX_PAGE_SIZE, fetch_page, ndjson_lines, projection_for
+from profile_cache import LocalSharedStore, ProfileCache, RedisSharedStore
+from recommendations import RECOMMENDATIONS_MAX, ProfileRecommender
+from qr_batches import QRBatchRunner
+from qr_codes import QR_MEDIA_TYPES, QRBusy, QRCodeCache, QRRenderPool, qr_digest, qr_payload
+from qr_tokens import QR_PAYLOAD_MODES, QRTokenSigner
+from serialization import FastJSONResponse, model_projection, raw_documents
+from transcription_backends import LocalWhisperBackend, TranscriptionBusy, TranscriptionError
+from transcription_jobs import (
+    TERMINAL_STATUSES,
+    LocalTranscriptionQueue,
+    MongoTranscriptionQueue,
+    TranscriptionWorkerPool,
+    public_job,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandTimer()])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -41,10 +87,251 @@ AZURE_OPENAI_KEY = os.environ.get('AZURE_OPENAI_KEY')
 AZURE_OPENAI_MODEL = os.environ.get('AZURE_OPENAI_MODEL')
 AZURE_TRANSCRIPTION_ENDPOINT = os.environ.get('AZURE_TRANSCRIPTION_ENDPOINT')
 AZURE_TRANSCRIPTION_KEY = os.environ.get('AZURE_TRANSCRIPTION_KEY')
+AZURE_TRANSCRIPTION_MODEL = os.environ.get('AZURE_TRANSCRIPTION_MODEL')
+TRANSCRIPTION_MAX_CONCURRENCY = int(os.environ.get('TRANSCRIPTION_MAX_CONCURRENCY', '8'))
+TRANSCRIPTION_MAX_WAITING = int(os.environ.get('TRANSCRIPTION_MAX_WAITING', '32'))
+TRANSCRIPTION_QUEUE_TIMEOUT = float(os.environ.get('TRANSCRIPTION_QUEUE_TIMEOUT', '5'))
+TRANSCRIPTION_TIMEOUT = float(os.environ.get('TRANSCRIPTION_TIMEOUT', '60'))
+TRANSCRIPTION_SEGMENT_SECONDS = int(os.environ.get('TRANSCRIPTION_SEGMENT_SECONDS', '60'))
+TRANSCRIPTION_SEGMENT_PARALLELISM = int(os.environ.get('TRANSCRIPTION_SEGMENT_PARALLELISM', '4'))
+TRANSCRIPTION_SEGMENT_MIN_BYTES = int(os.environ.get('TRANSCRIPTION_SEGMENT_MIN_BYTES', str(4 * 1024 * 1024)))
+TRANSCRIPTION_BACKEND = os.environ.get('TRANSCRIPTION_BACKEND', 'azure')
+LOCAL_WHISPER_MODEL = os.environ.get('LOCAL_WHISPER_MODEL', 'base')
+LOCAL_WHISPER_DEVICE = os.environ.get('LOCAL_WHISPER_DEVICE', 'cpu')
+LOCAL_WHISPER_COMPUTE_TYPE = os.environ.get('LOCAL_WHISPER_COMPUTE_TYPE', 'int8')
+LOCAL_WHISPER_CONCURRENCY = int(os.environ.get('LOCAL_WHISPER_CONCURRENCY', '2'))
+LOCAL_WHISPER_BATCH_SIZE = int(os.environ.get('LOCAL_WHISPER_BATCH_SIZE', '8'))
+LOCAL_WHISPER_LANGUAGE = os.environ.get('LOCAL_WHISPER_LANGUAGE') or None
+TRANSCRIPTION_QUEUE = os.environ.get('TRANSCRIPTION_QUEUE', 'mongo')
+TRANSCRIPTION_WORKERS = int(os.environ.get('TRANSCRIPTION_WORKERS', '2'))
+TRANSCRIPTION_JOB_POLL_INTERVAL = float(os.environ.get('TRANSCRIPTION_JOB_POLL_INTERVAL', '2'))
+AZURE_OPENAI_TIMEOUT = float(os.environ.get('AZURE_OPENAI_TIMEOUT', '30'))
+AZURE_OPENAI_MAX_CONNECTIONS = int(os.environ.get('AZURE_OPENAI_MAX_CONNECTIONS', '20'))
+LINKEDIN_MAX_CONNECTIONS = int(os.environ.get('LINKEDIN_MAX_CONNECTIONS', '10'))
+AI_MESSAGE_CACHE_SIZE = int(os.environ.get('AI_MESSAGE_CACHE_SIZE', '2048'))
+AI_MESSAGE_CACHE_TTL = float(os.environ.get('AI_MESSAGE_CACHE_TTL', '86400'))
+AI_MESSAGE_CACHE_MONGO = os.environ.get('AI_MESSAGE_CACHE_MONGO', 'true').lower() == 'true'
+FOLLOWUP_CONCURRENCY = int(os.environ.get('FOLLOWUP_CONCURRENCY', '4'))
+FOLLOWUP_FLUSH_SIZE = int(os.environ.get('FOLLOWUP_FLUSH_SIZE', '50'))
+MONGO_ENSURE_INDEXES = os.environ.get('MONGO_ENSURE_INDEXES', 'true').lower() == 'true'
+QR_CACHE_SIZE = int(os.environ.get('QR_CACHE_SIZE', '1024'))
+QR_CACHE_MONGO = os.environ.get('QR_CACHE_MONGO', 'false').lower() == 'true'
+QR_RENDER_EXECUTOR = os.environ.get('QR_RENDER_EXECUTOR', 'process')
+QR_RENDER_WORKERS = int(os.environ.get('QR_RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+QR_RENDER_MAX_PENDING = int(os.environ.get('QR_RENDER_MAX_PENDING', '64'))
+QR_HTTP_MAX_AGE = int(os.environ.get('QR_HTTP_MAX_AGE', '60'))
+QR_BATCH_CONCURRENCY = int(os.environ.get('QR_BATCH_CONCURRENCY', str(QR_RENDER_WORKERS * 2)))
+QR_BATCH_MAX_PROFILES = int(os.environ.get('QR_BATCH_MAX_PROFILES', '10000'))
+BULK_CONNECTIONS_MAX = int(os.environ.get('BULK_CONNECTIONS_MAX', '500'))
+QR_BATCH_RETENTION = float(os.environ.get('QR_BATCH_RETENTION', '3600'))
+QR_BATCH_BUSY_TIMEOUT = float(os.environ.get('QR_BATCH_BUSY_TIMEOUT', '30'))
+QR_PAYLOAD_DEFAULT = os.environ.get('QR_PAYLOAD_DEFAULT', 'profile')
+QR_TOKEN_SECRETS = [s.strip() for s in os.environ.get('QR_TOKEN_SECRETS', '').split(',') if s.strip()]
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', '4096'))
+PROFILE_CACHE_TTL = float(os.environ.get('PROFILE_CACHE_TTL', '300'))
+PROFILE_CACHE_LOCAL_TTL = float(os.environ.get('PROFILE_CACHE_LOCAL_TTL', '30'))
+PROFILE_CACHE_SHARED = os.environ.get('PROFILE_CACHE_SHARED', 'none')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+ANALYTICS_CACHE_TTL = float(os.environ.get('ANALYTICS_CACHE_TTL', '2'))
+CONNECTION_FEED = os.environ.get('CONNECTION_FEED', 'auto')
+CONNECTION_FEED_MAX_PENDING = int(os.environ.get('CONNECTION_FEED_MAX_PENDING', '200'))
+CONNECTION_FEED_LINGER = float(os.environ.get('CONNECTION_FEED_LINGER', '0.05'))
+CONNECTION_FEED_HEARTBEAT = float(os.environ.get('CONNECTION_FEED_HEARTBEAT', '25'))
+CONNECTION_FEED_SEND_TIMEOUT = float(os.environ.get('CONNECTION_FEED_SEND_TIMEOUT', '10'))
+CONNECTION_FEED_MAX_SUBSCRIBERS = int(os.environ.get('CONNECTION_FEED_MAX_SUBSCRIBERS', '10000'))
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'false').lower() == 'true'
 COHERE_API_KEY = os.environ.get('COHERE_API_KEY')
+COHERE_MODEL = os.environ.get('COHERE_MODEL', 'command-r-08-2024')
+COHERE_TIMEOUT = float(os.environ.get('COHERE_TIMEOUT', '30'))
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'none')
+COHERE_EMBED_MODEL = os.environ.get('COHERE_EMBED_MODEL', 'embed-english-light-v3.0')
+LOCAL_EMBEDDING_MODEL = os.environ.get('LOCAL_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+SEARCH_INDEX_USERS = int(os.environ.get('SEARCH_INDEX_USERS', '64'))
+SEARCH_INDEX_MAX_BYTES = int(os.environ.get('SEARCH_INDEX_MAX_BYTES', str(1024 * 1024 * 1024)))
+RECOMMENDATIONS_REFRESH_INTERVAL = float(os.environ.get('RECOMMENDATIONS_REFRESH_INTERVAL', '10'))
+AI_PROVIDERS = [name.strip() for name in os.environ.get('AI_PROVIDERS', 'azure').split(',') if name.strip()]
+AI_PROVIDER_COOLDOWN = float(os.environ.get('AI_PROVIDER_COOLDOWN', '30'))
+AI_TEMPLATE_LATENCY = float(os.environ.get('AI_TEMPLATE_LATENCY', '0'))
+
+# Outbound HTTP clients, one keep-alive pool per upstream
+http_clients = HTTPClientRegistry()
+http_clients.register(
+    "azure_openai",
+    http2=True,
+    timeout=AZURE_OPENAI_TIMEOUT,
+    max_connections=AZURE_OPENAI_MAX_CONNECTIONS,
+    max_keepalive_connections=AZURE_OPENAI_MAX_CONNECTIONS,
+)
+http_clients.register(
+    "azure_transcription",
+    http2=True,
+    timeout=TRANSCRIPTION_TIMEOUT,
+    max_connections=TRANSCRIPTION_MAX_CONCURRENCY,
+    max_keepalive_connections=TRANSCRIPTION_MAX_CONCURRENCY,
+)
+http_clients.register(
+    "cohere",
+    http2=True,
+    timeout=COHERE_TIMEOUT,
+    max_connections=AZURE_OPENAI_MAX_CONNECTIONS,
+    max_keepalive_connections=AZURE_OPENAI_MAX_CONNECTIONS,
+)
+http_clients.register(
+    "linkedin",
+    timeout=15.0,
+    max_connections=LINKEDIN_MAX_CONNECTIONS,
+    max_keepalive_connections=LINKEDIN_MAX_CONNECTIONS,
+)
+
+# Message generation providers, tried in AI_PROVIDERS order
+def build_ai_provider(name: str):
+    if name == "azure":
+        return AzureOpenAIProvider(
+            registry=http_clients,
+            endpoint=AZURE_OPENAI_ENDPOINT,
+            api_key=AZURE_OPENAI_KEY,
+            model=AZURE_OPENAI_MODEL,
+            timeout=AZURE_OPENAI_TIMEOUT,
+        )
+    if name == "cohere":
+        return CohereProvider(
+            registry=http_clients,
+            api_key=COHERE_API_KEY,
+            model=COHERE_MODEL,
+            timeout=COHERE_TIMEOUT,
+        )
+    if name == "template":
+        return TemplateProvider(latency=AI_TEMPLATE_LATENCY)
+    raise RuntimeError(f"Unknown AI provider: {name}")
 
-# Initialize Cohere client
-co = cohere.Client(COHERE_API_KEY)
+ai_providers = AIProviderChain(
+    [build_ai_provider(name) for name in AI_PROVIDERS],
+    cooldown=AI_PROVIDER_COOLDOWN,
+)
+
+# Generated message cache (memory LRU in front of MongoDB)
+ai_message_cache = AIMessageCache(
+    max_entries=AI_MESSAGE_CACHE_SIZE,
+    ttl=AI_MESSAGE_CACHE_TTL,
+    collection=db.ai_message_cache if AI_MESSAGE_CACHE_MONGO else None,
+)
+
+# Profile lookups by id (local LRU, optionally in front of a shared store)
+if PROFILE_CACHE_SHARED == "redis":
+    profile_cache_shared = RedisSharedStore(REDIS_URL)
+elif PROFILE_CACHE_SHARED == "local":
+    profile_cache_shared = LocalSharedStore()
+elif PROFILE_CACHE_SHARED == "none":
+    profile_cache_shared = None
+else:
+    raise RuntimeError(f"Unknown PROFILE_CACHE_SHARED: {PROFILE_CACHE_SHARED}")
+
+profile_cache = ProfileCache(
+    db.profiles,
+    max_entries=PROFILE_CACHE_SIZE,
+    ttl=PROFILE_CACHE_TTL,
+    # Without a shared store the local copy is the only tier; with one it
+    # is kept short so a missed invalidation heals quickly
+    local_ttl=PROFILE_CACHE_LOCAL_TTL if profile_cache_shared is not None else PROFILE_CACHE_TTL,
+    shared=profile_cache_shared,
+)
+
+# Per-event connection rollups, updated on every connection write
+connection_analytics = ConnectionAnalytics(db.connection_stats, db.connections, cache_ttl=ANALYTICS_CACHE_TTL)
+
+# Signed compact badge tokens; the first secret signs, all of them verify.
+# Without a configured secret, token badges are unavailable: a generated one
+# would stop resolving after a restart and on every other worker.
+if QR_PAYLOAD_DEFAULT not in QR_PAYLOAD_MODES:
+    raise RuntimeError(f"Unknown QR_PAYLOAD_DEFAULT: {QR_PAYLOAD_DEFAULT}")
+if QR_PAYLOAD_DEFAULT == "token" and not QR_TOKEN_SECRETS:
+    raise RuntimeError("QR_PAYLOAD_DEFAULT=token requires QR_TOKEN_SECRETS")
+qr_tokens = QRTokenSigner(QR_TOKEN_SECRETS) if QR_TOKEN_SECRETS else None
+
+def check_payload_mode(payload: str):
+    if payload not in QR_PAYLOAD_MODES:
+        raise HTTPException(status_code=400, detail="payload must be profile or token")
+    if payload == "token" and qr_tokens is None:
+        raise HTTPException(status_code=400, detail="payload=token is unavailable: QR_TOKEN_SECRETS is not configured")
+
+def badge_payload(profile: dict, payload: str) -> str:
+    if payload == "token":
+        return qr_tokens.sign(profile["id"])
+    return qr_payload(profile)
+
+# Rendered QR code cache (memory LRU, optionally backed by MongoDB)
+qr_cache = QRCodeCache(
+    max_entries=QR_CACHE_SIZE,
+    collection=db.qr_codes if QR_CACHE_MONGO else None,
+)
+qr_render_pool = QRRenderPool(
+    max_workers=QR_RENDER_WORKERS,
+    max_pending=QR_RENDER_MAX_PENDING,
+    kind=QR_RENDER_EXECUTOR,
+)
+
+async def render_badge(profile: dict, image_format: str, payload: str) -> bytes:
+    # Bulk jobs bypass the QR cache so they don't evict the hot entries
+    return await qr_render_pool.render(badge_payload(profile, payload), image_format)
+
+qr_batches = QRBatchRunner(
+    render=render_badge,
+    concurrency=min(QR_BATCH_CONCURRENCY, QR_RENDER_MAX_PENDING // 2 or 1),
+    retention=QR_BATCH_RETENTION,
+    busy_timeout=QR_BATCH_BUSY_TIMEOUT,
+)
+
+# Speech-to-text backend, selected by TRANSCRIPTION_BACKEND
+if TRANSCRIPTION_BACKEND == "local":
+    transcription_backend = LocalWhisperBackend(
+        model_size=LOCAL_WHISPER_MODEL,
+        device=LOCAL_WHISPER_DEVICE,
+        compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+        batch_size=LOCAL_WHISPER_BATCH_SIZE,
+        language=LOCAL_WHISPER_LANGUAGE,
+        max_concurrency=LOCAL_WHISPER_CONCURRENCY,
+        max_waiting=TRANSCRIPTION_MAX_WAITING,
+    )
+elif TRANSCRIPTION_BACKEND == "azure":
+    transcription_backend = AzureTranscriptionClient(
+        registry=http_clients,
+        endpoint=AZURE_TRANSCRIPTION_ENDPOINT,
+        api_key=AZURE_TRANSCRIPTION_KEY,
+        model=AZURE_TRANSCRIPTION_MODEL,
+        max_concurrency=TRANSCRIPTION_MAX_CONCURRENCY,
+        max_waiting=TRANSCRIPTION_MAX_WAITING,
+        acquire_timeout=TRANSCRIPTION_QUEUE_TIMEOUT,
+    )
+else:
+    raise RuntimeError(f"Unknown TRANSCRIPTION_BACKEND: {TRANSCRIPTION_BACKEND}")
+
+# Text embeddings for semantic search; "none" leaves search keyword-only
+if EMBEDDING_BACKEND == "cohere":
+    embedder = CohereEmbedder(registry=http_clients, api_key=COHERE_API_KEY, model=COHERE_EMBED_MODEL)
+elif EMBEDDING_BACKEND == "local":
+    embedder = LocalEmbedder(model=LOCAL_EMBEDDING_MODEL)
+elif EMBEDDING_BACKEND == "none":
+    embedder = None
+else:
+    raise RuntimeError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+
+connection_search = ConnectionSearch(
+    db.connections,
+    db.connection_embeddings,
+    embedder=embedder,
+    max_users=SEARCH_INDEX_USERS,
+    max_bytes=SEARCH_INDEX_MAX_BYTES,
+)
+
+# "Who should I meet": profile embeddings in one in-memory index
+recommender = ProfileRecommender(
+    db.profiles,
+    db.profile_embeddings,
+    db.connections,
+    embedder,
+    refresh_interval=RECOMMENDATIONS_REFRESH_INTERVAL,
+) if embedder is not None else None
 
 # Data Models
 class UserProfile(BaseModel):
@@ -92,10 +379,37 @@ class CreateConnection(BaseModel):
     person_category: str
     notes: Optional[str] = None
 
+class BulkConnectionItem(CreateConnection):
+    idempotency_key: Optional[str] = None
+
+class BulkConnectionRequest(BaseModel):
+    connections: List[dict]
+
+class FollowUpBatchRequest(BaseModel):
+    user_id: str
+    event_name: str
+
+class QRBatchRequest(BaseModel):
+    user_ids: Optional[List[str]] = None
+    event_name: Optional[str] = None
+    output: str = "zip"
+    image_format: str = "png"
+    payload: str = "profile"
+
 class LinkedInAuth(BaseModel):
     code: str
     state: str
 
+# Live connection updates per user (change stream, or in-process publish)
+connection_feed = ConnectionFeed(
+    db.connections,
+    Connection.model_fields,
+    mode=CONNECTION_FEED,
+    max_pending=CONNECTION_FEED_MAX_PENDING,
+    linger=CONNECTION_FEED_LINGER,
+    max_subscribers=CONNECTION_FEED_MAX_SUBSCRIBERS,
+)
+
 # Basic Routes
 @api_router.get("/")
 async def root():
@@ -106,181 +420,657 @@ async def root():
 async def create_profile(profile: CreateUserProfile):
     profile_dict = profile.dict()
     profile_obj = UserProfile(**profile_dict)
-    await db.profiles.insert_one(profile_obj.dict())
+    # BSON dates hold milliseconds; truncate now so the cached copy and the
+    # response match what MongoDB returns later
+    profile_obj.created_at = profile_obj.created_at.replace(
+        microsecond=profile_obj.created_at.microsecond // 1000 * 1000
+    )
+    document = {**profile_obj.dict(), **search_fields(profile_dict)}
+    await db.profiles.insert_one(document)
+    await profile_cache.put(document)
+    if recommender is not None:
+        recommender.add(document)
     return profile_obj
 
 @api_router.get("/profile/{user_id}", response_model=UserProfile)
 async def get_profile(user_id: str):
-    profile = await db.profiles.find_one({"id": user_id})
+    profile = await profile_cache.get(user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return UserProfile(**profile)
 
 @api_router.get("/profiles", response_model=List[UserProfile])
-async def get_all_profiles():
-    profiles = await db.profiles.find().to_list(1000)
-    return [UserProfile(**profile) for profile in profiles]
+async def list_profiles(
+    limit: int = Query(50, ge=1, le=DIRECTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    name: Optional[str] = None,
+    company: Optional[str] = None,
+    title: Optional[str] = None,
+    sort: str = "name",
+    fields: Optional[str] = None
+):
+    # Attendee directory: one keyset page at a time, next page's cursor in
+    # X-Next-Cursor. q is full-text; name/company/title are prefix filters.
+    if sort not in DIRECTORY_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(DIRECTORY_SORTS)}")
+    query = directory_query(q=q, name=name, company=company, title=title)
+    projection = projection_for(fields, UserProfile.model_fields) or model_projection(UserProfile)
+    
+    profiles, next_cursor = await fetch_page(
+        db.profiles, query, cursor, limit, projection, sort=DIRECTORY_SORTS[sort]
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    # Stored documents were validated on write; serialize them as they are
+    if not fields:
+        raw_documents(profiles, UserProfile)
+    return FastJSONResponse(profiles, headers=headers)
 
 # QR Code Generation
+async def get_qr_image(profile: dict, image_format: str = "png", payload_mode: str = "profile"):
+    # The image depends only on the encoded payload
+    payload = badge_payload(profile, payload_mode)
+    digest = qr_digest(payload, image_format)
+    image = await qr_cache.get(digest)
+    if image is None:
+        image = await qr_render_pool.render(payload, image_format)
+        await qr_cache.set(digest, profile["id"], image_format, image, payload_mode)
+    return digest, image
+
 @api_router.get("/qr-code/{user_id}")
-async def generate_qr_code(user_id: str):
+async def generate_qr_code(user_id: str, request: Request, format: str = "data-uri",
+                           payload: str = QR_PAYLOAD_DEFAULT):
+    # payload=token encodes a short signed token instead of the profile JSON;
+    # scanners turn it back into the profile with /qr-code/resolve/{token}
+    if format not in ("data-uri", "png", "svg"):
+        raise HTTPException(status_code=400, detail="format must be one of: data-uri, png, svg")
+    check_payload_mode(payload)
     try:
-        profile = await db.profiles.find_one({"id": user_id})
+        profile = await profile_cache.get(user_id)
         if not profile:
             raise HTTPException(status_code=404, detail="Profile not found")
         
-        # Create QR code data
-        qr_data = {
-            "id": profile["id"],
-            "name": profile["name"],
-            "linkedin_url": profile.get("linkedin_url"),
-            "email": profile.get("email"),
-            "title": profile.get("title"),
-            "company": profile.get("company")
-        }
+        image_format = "svg" if format == "svg" else "png"
+        digest = qr_digest(badge_payload(profile, payload), image_format)
+        etag = f'"{digest}-{format}"'
+        if format == "data-uri":
+            headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        else:
+            # Raw images are addressable by URL, so browsers and nginx can cache them
+            headers = {"ETag": etag, "Cache-Control": f"public, max-age={QR_HTTP_MAX_AGE}"}
         
-        # Generate QR code
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(json.dumps(qr_data))
-        qr.make(fit=True)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
         
-        # Create image
-        img = qr.make_image(fill_color="black", back_color="white")
+        digest, image = await get_qr_image(profile, image_format, payload)
         
-        # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        img_base64 = base64.b64encode(buffer.read()).decode()
+        if format != "data-uri":
+            return Response(content=image, media_type=QR_MEDIA_TYPES[image_format], headers=headers)
         
-        return {"qr_code": f"data:image/png;base64,{img_base64}"}
+        img_base64 = base64.b64encode(image).decode()
+        return FastJSONResponse(
+            content={"qr_code": f"data:image/png;base64,{img_base64}"},
+            headers=headers
+        )
     
+    except HTTPException:
+        raise
+    except QRBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Compact QR token lookup
+@api_router.get("/qr-code/resolve/{token}", response_model=UserProfile)
+async def resolve_qr_token(token: str):
+    # Scanned compact badge -> profile; forged and malformed tokens look
+    # the same as unknown ones
+    user_id = qr_tokens.verify(token) if qr_tokens is not None else None
+    profile = await profile_cache.get(user_id) if user_id else None
+    if not profile:
+        raise HTTPException(status_code=404, detail="Unknown QR code")
+    return UserProfile(**profile)
+
+# Bulk QR badges
+@api_router.post("/qr-code/batch")
+async def create_qr_batch(batch: QRBatchRequest):
+    if batch.output not in ("zip", "pdf"):
+        raise HTTPException(status_code=400, detail="output must be zip or pdf")
+    if batch.image_format not in QR_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="image_format must be png or svg")
+    if batch.output == "pdf" and batch.image_format != "png":
+        raise HTTPException(status_code=400, detail="pdf output requires png images")
+    check_payload_mode(batch.payload)
+    
+    if batch.user_ids:
+        user_ids = list(dict.fromkeys(batch.user_ids))
+    elif batch.event_name:
+        # Attendees of an event are the users who logged connections there
+        user_ids = await db.connections.distinct("user_id", {"event_name": batch.event_name})
+    else:
+        raise HTTPException(status_code=400, detail="Provide user_ids or event_name")
+    
+    if len(user_ids) > QR_BATCH_MAX_PROFILES:
+        raise HTTPException(status_code=400, detail=f"At most {QR_BATCH_MAX_PROFILES} profiles per batch")
+    
+    projection = {"_id": 0, "id": 1, "name": 1, "linkedin_url": 1, "email": 1, "title": 1, "company": 1}
+    profiles = await db.profiles.find({"id": {"$in": user_ids}}, projection).to_list(None)
+    found = {profile["id"] for profile in profiles}
+    
+    job = qr_batches.submit(profiles, output=batch.output, image_format=batch.image_format, payload=batch.payload)
+    return {**job.to_dict(), "missing": [uid for uid in user_ids if uid not in found]}
+
+@api_router.get("/qr-code/batch/{job_id}")
+async def get_qr_batch(job_id: str):
+    job = qr_batches.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job.to_dict()
+
+@api_router.get("/qr-code/batch/{job_id}/download")
+async def download_qr_batch(job_id: str):
+    job = qr_batches.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Batch job is {job.status}")
+    return FileResponse(job.path, media_type=job.media_type, filename=job.filename)
+
 # Voice Transcription
-@api_router.post("/transcribe")
-async def transcribe_audio(audio_file: UploadFile = File(...)):
-    try:
-        # Read audio file
-        audio_data = await audio_file.read()
-        
-        # Prepare the request to Azure OpenAI Whisper
-        headers = {
-            "api-key": AZURE_TRANSCRIPTION_KEY,
-        }
+async def transcribe_segments(audio: BinaryIO, filename: str, content_type: Optional[str]) -> Optional[str]:
+    # Long recordings are cut into segments, transcribed in parallel (bounded
+    # by the transcription client) and stitched back in order. Returns None
+    # when segmenting isn't possible so the caller can send the file whole.
+    suffix = audio_suffix(filename, content_type)
+    with tempfile.TemporaryDirectory(prefix="transcribe-") as work_dir:
+        try:
+            segments = await split_audio(audio, suffix, TRANSCRIPTION_SEGMENT_SECONDS, work_dir)
+        except RuntimeError as e:
+            logger.warning("Audio segmentation failed, sending whole file: %s", e)
+            return None
+        if len(segments) < 2:
+            return None
         
-        files = {
-            "file": (audio_file.filename, audio_data, audio_file.content_type)
-        }
+        # Keep one long clip from taking every shared transcription slot
+        slots = asyncio.Semaphore(TRANSCRIPTION_SEGMENT_PARALLELISM)
         
-        data = {
-            "model": os.environ.get('AZURE_TRANSCRIPTION_MODEL')
-        }
+        async def transcribe_segment(path: str) -> str:
+            async with slots:
+                with open(path, "rb") as segment:
+                    return await transcription_backend.transcribe(
+                        os.path.basename(path),
+                        segment,
+                        content_type
+                    )
         
-        # Make request to Azure OpenAI
-        response = requests.post(
-            AZURE_TRANSCRIPTION_ENDPOINT,
-            headers=headers,
-            files=files,
-            data=data
+        parts = await asyncio.gather(*(transcribe_segment(path) for path in segments))
+    return " ".join(part.strip() for part in parts if part.strip())
+
+async def transcribe_file(audio: BinaryIO, filename: str, content_type: Optional[str]) -> str:
+    # The file object is streamed out rather than read into memory
+    audio.seek(0, os.SEEK_END)
+    size = audio.tell()
+    audio.seek(0)
+    if transcription_backend.segment_long_audio and size >= TRANSCRIPTION_SEGMENT_MIN_BYTES and ffmpeg_path():
+        transcript = await transcribe_segments(audio, filename, content_type)
+        if transcript is not None:
+            return transcript
+        audio.seek(0)
+    return await transcription_backend.transcribe(filename, audio, content_type)
+
+if TRANSCRIPTION_QUEUE == "local":
+    transcription_queue = LocalTranscriptionQueue()
+elif TRANSCRIPTION_QUEUE == "mongo":
+    transcription_queue = MongoTranscriptionQueue(db)
+else:
+    raise RuntimeError(f"Unknown TRANSCRIPTION_QUEUE: {TRANSCRIPTION_QUEUE}")
+transcription_workers = TranscriptionWorkerPool(
+    transcription_queue,
+    transcribe=lambda job, audio: transcribe_file(audio, job["filename"], job["content_type"]),
+    workers=TRANSCRIPTION_WORKERS,
+)
+
+@api_router.post("/transcribe")
+async def transcribe_audio(audio_file: UploadFile = File(...)):
+    try:
+        # Starlette spools large uploads to disk, so this stays off the heap
+        transcript = await transcribe_file(
+            audio_file.file,
+            audio_file.filename,
+            audio_file.content_type
         )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return {"transcript": result.get("text", "")}
-        else:
-            raise HTTPException(status_code=500, detail="Transcription failed")
-            
+        return {"transcript": transcript}
+    
+    except TranscriptionBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except TranscriptionError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/transcribe/jobs", status_code=202)
+async def create_transcription_job(audio_file: UploadFile = File(...)):
+    # Returns at once; poll GET /transcribe/jobs/{job_id} or subscribe to
+    # the WebSocket for the result
+    job = await transcription_workers.enqueue(
+        audio_file.filename,
+        audio_file.content_type,
+        audio_file.file
+    )
+    return public_job(job)
+
+@api_router.get("/transcribe/jobs/{job_id}")
+async def get_transcription_job(job_id: str):
+    job = await transcription_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Transcription job not found")
+    return public_job(job)
+
+@api_router.websocket("/transcribe/jobs/{job_id}/ws")
+async def transcription_job_updates(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    last_status = None
+    try:
+        while True:
+            job = await transcription_queue.get(job_id)
+            if not job:
+                await websocket.send_json({"id": job_id, "status": "not_found"})
+                break
+            if job["status"] != last_status:
+                last_status = job["status"]
+                await websocket.send_json(jsonable_encoder(public_job(job)))
+            if job["status"] in TERMINAL_STATUSES:
+                break
+            await transcription_workers.wait_for_update(job_id, timeout=TRANSCRIPTION_JOB_POLL_INTERVAL)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 # AI Message Generation
+async def complete_ai_message(payload: dict, connection_data: dict) -> Tuple[str, bool]:
+    # For ai_message_cache.get_or_create: fallback answers are returned but
+    # not cached
+    reply = await ai_providers.complete(payload, connection_data)
+    return reply.text, reply.provider == ai_providers.primary
+
 @api_router.post("/generate-message")
-async def generate_ai_message(connection_data: dict):
+async def generate_ai_message(connection_data: dict, regenerate: bool = False):
     try:
-        # Create prompt for AI message generation
-        prompt = f"""
-        Create a professional LinkedIn connection message based on this networking interaction:
-        
-        Contact: {connection_data.get('contact_name')}
-        Their Role: {connection_data.get('contact_title', 'Professional')} at {connection_data.get('contact_company', 'their company')}
-        Event: {connection_data.get('event_name')} ({connection_data.get('event_type')})
-        Connection Type: {connection_data.get('person_category')}
-        Conversation Summary: {connection_data.get('voice_transcript', 'Had a great conversation')}
-        Additional Notes: {connection_data.get('notes', 'None')}
-        
-        Write a personalized LinkedIn connection message that:
-        1. Mentions where we met specifically
-        2. References something from our conversation
-        3. Suggests a relevant next step based on the connection type
-        4. Maintains a professional but friendly tone
-        5. Is concise (under 200 characters for LinkedIn limit)
-        
-        Message:
-        """
-        
-        # Use Azure OpenAI to generate message
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": AZURE_OPENAI_KEY
-        }
-        
-        payload = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a professional networking assistant. Create personalized LinkedIn connection messages that are warm, specific, and actionable."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
-            "max_tokens": 150,
-            "temperature": 0.7
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                AZURE_OPENAI_ENDPOINT,
-                headers=headers,
-                json=payload
-            )
-            
-        if response.status_code == 200:
-            result = response.json()
-            message = result["choices"][0]["message"]["content"].strip()
-            return {"ai_message": message}
-        else:
-            raise HTTPException(status_code=500, detail="AI message generation failed")
-            
+        # Identical connection data (double taps, retries) is served from the
+        # cache; regenerate=true forces a fresh completion
+        payload = build_chat_payload(connection_data)
+        fingerprint = prompt_fingerprint(ai_providers.model_id, payload)
+        message = await ai_message_cache.get_or_create(
+            fingerprint,
+            lambda: complete_ai_message(payload, connection_data),
+            bypass=regenerate
+        )
+        return {"ai_message": message}
+    
+    except AIRateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/generate-message/stream")
+async def stream_generate_ai_message(connection_data: dict, regenerate: bool = False):
+    # Server-Sent Events: "token" events carry text as it is generated, then
+    # one "done" event with the final message (or "error")
+    payload = build_chat_payload(connection_data)
+    fingerprint = prompt_fingerprint(ai_providers.model_id, payload)
+    cached = None if regenerate else await ai_message_cache.get(fingerprint)
+    
+    async def events():
+        if cached is not None:
+            yield sse_event("token", {"text": cached})
+            yield sse_event("done", {"ai_message": cached, "cached": True})
+            return
+        
+        parts = []
+        reply = AIReply()
+        try:
+            async for content in ai_providers.stream(payload, connection_data, reply):
+                parts.append(content)
+                yield sse_event("token", {"text": content})
+        except AIRateLimited as e:
+            yield sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        
+        message = "".join(parts).strip()
+        if not message:
+            # Content-filtered or empty upstream stream; nothing to keep
+            yield sse_event("error", {"detail": "AI message generation returned no text"})
+            return
+        if reply.provider == ai_providers.primary:
+            await ai_message_cache.set(fingerprint, message)
+        yield sse_event("done", {"ai_message": message, "cached": False})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Batch follow-up generation
+async def generate_follow_up(connection: dict) -> str:
+    # Stored fields are None when unset; drop them so the prompt defaults apply
+    connection_data = {k: v for k, v in connection.items() if v is not None}
+    payload = build_chat_payload(connection_data)
+    return await ai_message_cache.get_or_create(
+        prompt_fingerprint(ai_providers.model_id, payload),
+        lambda: complete_ai_message(payload, connection_data)
+    )
+
+followup_jobs = FollowUpJobRunner(
+    db,
+    generate=generate_follow_up,
+    concurrency=FOLLOWUP_CONCURRENCY,
+    flush_size=FOLLOWUP_FLUSH_SIZE,
+)
+
+@api_router.post("/follow-ups/batch")
+async def create_follow_up_batch(batch: FollowUpBatchRequest):
+    return await followup_jobs.create(batch.user_id, batch.event_name)
+
+@api_router.get("/follow-ups/batch/{job_id}")
+async def get_follow_up_batch(job_id: str):
+    job = await followup_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Follow-up job not found")
+    return job
+
 # Connection Management
 @api_router.post("/connection", response_model=Connection)
 async def create_connection(connection: CreateConnection):
     connection_dict = connection.dict()
     connection_obj = Connection(**connection_dict)
-    await db.connections.insert_one(connection_obj.dict())
+    document = connection_obj.dict()
+    await db.connections.insert_one(document)
+    await connection_analytics.record([(None, document)])
+    connection_search.enqueue(document)
+    connection_feed.publish(document)
     return connection_obj
 
+@api_router.post("/connections/bulk")
+async def create_connections_bulk(bulk: BulkConnectionRequest):
+    # Offline clients replay their queue here in one round-trip. Items that
+    # carry an idempotency_key are upserted on (user_id, idempotency_key), so
+    # a replayed item reports "duplicate" with the original id.
+    if len(bulk.connections) > BULK_CONNECTIONS_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_CONNECTIONS_MAX} connections per request")
+    
+    results = [None] * len(bulk.connections)
+    operations = []
+    op_items = []
+    for index, raw in enumerate(bulk.connections):
+        try:
+            item = BulkConnectionItem(**raw)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "invalid", "error": e.errors(include_url=False)}
+            continue
+        
+        connection_obj = Connection(**item.dict(exclude={"idempotency_key"}))
+        doc = connection_obj.dict()
+        if item.idempotency_key:
+            doc["idempotency_key"] = item.idempotency_key
+            operations.append(UpdateOne(
+                {"user_id": item.user_id, "idempotency_key": item.idempotency_key},
+                {"$setOnInsert": doc},
+                upsert=True
+            ))
+        else:
+            operations.append(InsertOne(doc))
+        op_items.append((index, item, doc))
+    
+    write_errors = {}
+    upserted = set()
+    if operations:
+        try:
+            result = await db.connections.bulk_write(operations, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+        write_errors = {error["index"]: error for error in details.get("writeErrors", [])}
+        upserted = {entry["index"] for entry in details.get("upserted", [])}
+    
+    # Keys that already existed (or lost an upsert race) resolve to the stored id
+    replayed = [
+        (op_index, item) for op_index, (_, item, _) in enumerate(op_items)
+        if item.idempotency_key and op_index not in upserted
+        and write_errors.get(op_index, {}).get("code", 11000) == 11000
+    ]
+    existing_ids = {}
+    if replayed:
+        async for doc in db.connections.find(
+            {"$or": [{"user_id": item.user_id, "idempotency_key": item.idempotency_key} for _, item in replayed]},
+            {"_id": 0, "id": 1, "user_id": 1, "idempotency_key": 1}
+        ):
+            existing_ids[(doc["user_id"], doc["idempotency_key"])] = doc["id"]
+    
+    created = []
+    for op_index, (index, item, doc) in enumerate(op_items):
+        error = write_errors.get(op_index)
+        entry = {"index": index, "idempotency_key": item.idempotency_key}
+        existing_id = existing_ids.get((item.user_id, item.idempotency_key))
+        if existing_id is not None and op_index not in upserted:
+            entry.update(status="duplicate", id=existing_id)
+        elif error is not None:
+            entry.update(status="error", error=error.get("errmsg"))
+        else:
+            entry.update(status="created", id=doc["id"])
+            created.append(doc)
+            connection_search.enqueue(doc)
+            connection_feed.publish(doc)
+        results[index] = entry
+    
+    await connection_analytics.record([(None, doc) for doc in created])
+    summary = {"created": 0, "duplicate": 0, "invalid": 0, "error": 0}
+    for entry in results:
+        summary[entry["status"]] += 1
+    return {"results": results, **summary}
+
 @api_router.get("/connections/{user_id}", response_model=List[Connection])
-async def get_user_connections(user_id: str):
-    connections = await db.connections.find({"user_id": user_id}).to_list(1000)
-    return [Connection(**connection) for connection in connections]
+async def get_user_connections(
+    user_id: str,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json"
+):
+    # Newest first, paged by (created_at, id); the next page's cursor is
+    # returned in the X-Next-Cursor header so the body stays a plain list.
+    query = {"user_id": user_id}
+    projection = projection_for(fields, Connection.model_fields) or model_projection(Connection)
+    
+    if format == "ndjson":
+        return StreamingResponse(
+            ndjson_lines(db.connections, query, cursor, projection),
+            media_type="application/x-ndjson"
+        )
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    
+    connections, next_cursor = await fetch_page(db.connections, query, cursor, limit, projection)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    # Raw documents skip the Connection round-trip; sparse fieldsets are
+    # returned as projected
+    if not fields:
+        raw_documents(connections, Connection)
+    return FastJSONResponse(connections, headers=headers)
 
 @api_router.put("/connection/{connection_id}")
 async def update_connection(connection_id: str, updates: dict):
-    result = await db.connections.update_one(
+    # The previous version tells analytics which counters to move
+    previous = await db.connections.find_one_and_update(
         {"id": connection_id},
-        {"$set": updates}
+        {"$set": updates},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Connection not found")
+    connection = {**previous, **updates}
+    await connection_analytics.record([(previous, connection)])
+    if any(field in updates for field in SEARCH_TEXT_FIELDS):
+        connection_search.enqueue(connection)
+    connection_feed.publish(connection)
     return {"message": "Connection updated successfully"}
 
+@api_router.get("/connections/{user_id}/search", response_model=List[Connection])
+async def search_connections(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=500),
+    mode: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    # Ranked search over contact name, company, notes and transcript. mode
+    # is text (keywords), semantic (embeddings) or hybrid (both, fused);
+    # the default is hybrid when an embedding backend is configured. Each
+    # result carries a "score"; pages continue via X-Next-Cursor.
+    mode = mode or ("hybrid" if connection_search.semantic else "text")
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+    if mode != "text" and not connection_search.semantic:
+        raise HTTPException(status_code=400, detail="Semantic search is not configured")
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not 0 <= offset < SEARCH_MAX_RESULTS:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    try:
+        items, more = await connection_search.search(
+            user_id, q, mode, limit, offset, model_projection(Connection)
+        )
+    except EmbeddingError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    headers = {"X-Next-Cursor": str(offset + limit)} if more else {}
+    return FastJSONResponse(raw_documents(items, Connection), headers=headers)
+
+@api_router.post("/connections/search/reindex", status_code=202)
+async def reindex_connection_search(user_id: Optional[str] = None):
+    # Embeds connections written before semantic search was enabled (or
+    # under a previous model)
+    if not connection_search.semantic:
+        raise HTTPException(status_code=400, detail="Semantic search is not configured")
+    if not connection_search.backfill(user_id):
+        raise HTTPException(status_code=409, detail="A reindex is already running")
+    return {"started": True}
+
+@api_router.websocket("/connections/{user_id}/ws")
+async def connection_updates(websocket: WebSocket, user_id: str):
+    # Pushes {"type": "connections", "items": [...]} with the new or changed
+    # connections, coalesced per connection. "ready" is sent once subscribed
+    # (load the list after it to close the gap), "resync" when the client
+    # fell too far behind and should reload, "ping" when idle.
+    await websocket.accept()
+    try:
+        async with connection_feed.subscribe(user_id) as subscription:
+            await pump_websocket(websocket, subscription, CONNECTION_FEED_HEARTBEAT, CONNECTION_FEED_SEND_TIMEOUT)
+    except FeedFull as e:
+        await websocket.close(code=1013, reason=str(e))
+    except asyncio.TimeoutError:
+        # Not reading fast enough; the client reconnects and resyncs
+        await websocket.close(code=1013, reason="Client too slow")
+    except WebSocketDisconnect:
+        pass
+
+@api_router.get("/connections/{user_id}/events")
+async def connection_events(user_id: str):
+    # Server-Sent Events variant of the WebSocket feed, same messages as
+    # named events, with comment lines as heartbeats
+    if connection_feed.full:
+        raise HTTPException(status_code=503, detail="Too many live connection feeds", headers={"Retry-After": "30"})
+
+    async def events():
+        # Subscribe inside the body so the slot is only held while the
+        # response is actually streaming
+        try:
+            async with connection_feed.subscribe(user_id) as subscription:
+                yield sse_frame({"type": "ready"})
+                while True:
+                    message = await subscription.next_message(CONNECTION_FEED_HEARTBEAT)
+                    # A slow reader blocks here on transport backpressure while
+                    # its pending changes coalesce (or overflow into "resync")
+                    yield b": ping\n\n" if message["type"] == "ping" else sse_frame(message)
+        except FeedFull as e:
+            # Filled up between the check above and the first read
+            yield sse_frame({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Recommendations
+@api_router.get("/recommendations/stats")
+async def get_recommendation_stats():
+    if recommender is None:
+        raise HTTPException(status_code=400, detail="Recommendations need an embedding backend")
+    return recommender.stats()
+
+@api_router.post("/recommendations/rebuild", status_code=202)
+async def rebuild_recommendations():
+    # Re-embeds every profile, picking up connection categories gathered
+    # since it was last embedded
+    if recommender is None:
+        raise HTTPException(status_code=400, detail="Recommendations need an embedding backend")
+    if not recommender.rebuild():
+        raise HTTPException(status_code=409, detail="A rebuild is already running")
+    return {"started": True}
+
+@api_router.get("/recommendations/{user_id}", response_model=List[UserProfile])
+async def recommend_profiles(
+    user_id: str,
+    limit: int = Query(10, ge=1, le=RECOMMENDATIONS_MAX),
+    event_name: Optional[str] = None
+):
+    # Profiles most similar to this user's (title, company, who they meet),
+    # each with a "score"; event_name limits them to that event's attendees
+    if recommender is None:
+        raise HTTPException(status_code=400, detail="Recommendations need an embedding backend")
+    matches = await recommender.recommend(user_id, limit, event_name)
+    if matches is None:
+        if await profile_cache.get(user_id) is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        # Created moments ago; its embedding is still queued
+        raise HTTPException(status_code=503, detail="Recommendations not ready yet", headers={"Retry-After": "2"})
+    
+    scores = dict(matches)
+    profiles = {
+        doc["id"]: doc async for doc in
+        db.profiles.find({"id": {"$in": list(scores)}}, model_projection(UserProfile))
+    }
+    items = [{**profiles[key], "score": round(score, 6)} for key, score in matches if key in profiles]
+    return FastJSONResponse(raw_documents(items, UserProfile))
+
+# Event analytics (precomputed rollups)
+@api_router.get("/analytics/events")
+async def list_event_analytics(limit: int = Query(50, ge=1, le=500)):
+    return await connection_analytics.events(limit)
+
+@api_router.get("/analytics/events/{event_name}")
+async def get_event_analytics(event_name: str):
+    # Totals, connection_sent share, and breakdowns by person_category and
+    # event_type for one event
+    summary = await connection_analytics.event_summary(event_name)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No connections for this event")
+    return summary
+
+@api_router.post("/analytics/rebuild")
+async def rebuild_event_analytics():
+    rows = await connection_analytics.rebuild()
+    return {"rows": rows}
+
 # LinkedIn OAuth
 @api_router.get("/linkedin/auth-url")
 async def get_linkedin_auth_url():
@@ -314,9 +1104,8 @@ async def exchange_linkedin_token(auth_data: LinkedInAuth):
         
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=data, headers=headers)
-            
+        response = await http_clients.get("linkedin").post(token_url, data=data, headers=headers)
+        
         if response.status_code == 200:
             token_data = response.json()
             return token_data
@@ -357,15 +1146,66 @@ async def get_person_categories():
         ]
     }
 
+# Outbound connection pool stats
+@api_router.get("/http-clients/stats")
+async def get_http_client_stats():
+    return {
+        "clients": http_clients.stats(),
+        "transcription": transcription_backend.stats()
+    }
+
+# Message provider health (calls, failures, timeouts, cooldowns)
+@api_router.get("/generate-message/providers")
+async def get_ai_provider_stats():
+    return ai_providers.stats()
+
+# Generated message cache stats
+@api_router.get("/generate-message/cache/stats")
+async def get_ai_message_cache_stats():
+    return ai_message_cache.stats()
+
+# Profile cache stats
+@api_router.get("/profile-cache/stats")
+async def get_profile_cache_stats():
+    return profile_cache.stats()
+
+# Connection search stats
+@api_router.get("/connections/search/stats")
+async def get_connection_search_stats():
+    return connection_search.stats()
+
+# Live connection feed stats
+@api_router.get("/connection-feed/stats")
+async def get_connection_feed_stats():
+    return connection_feed.stats()
+
+# QR cache and render pool stats
+@api_router.get("/qr-code-cache/stats")
+async def get_qr_cache_stats():
+    return {**qr_cache.stats(), "render_pool": qr_render_pool.stats()}
+
+# Prometheus scrape endpoint, outside /api like the usual /metrics
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+if METRICS_ENABLED:
+    # Per-route and per-upstream timings; SERVER_TIMING=true also sends the
+    # breakdown to the browser in a Server-Timing header
+    app.add_middleware(MetricsMiddleware, server_timing=SERVER_TIMING)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Server-Timing"],
 )
 
 # Configure logging
@@ -375,6 +1215,104 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_db_indexes():
+    if MONGO_ENSURE_INDEXES:
+        await ensure_indexes(db)
+
+@app.on_event("startup")
+async def startup_profile_directory():
+    if MONGO_ENSURE_INDEXES:
+        updated = await backfill_search_fields(db.profiles)
+        if updated:
+            logger.info("Added directory search fields to %s profiles", updated)
+
+@app.on_event("startup")
+async def startup_connection_analytics():
+    # First deploy with analytics: build the rollups from existing connections
+    if MONGO_ENSURE_INDEXES and not await db.connection_stats.find_one({}):
+        rows = await connection_analytics.rebuild()
+        if rows:
+            logger.info("Built %s connection analytics rows", rows)
+
+@app.on_event("startup")
+async def startup_profile_cache():
+    await profile_cache.start()
+
+@app.on_event("shutdown")
+async def shutdown_profile_cache():
+    await profile_cache.close()
+
+@app.on_event("startup")
+async def startup_connection_search():
+    # Loads the local embedding model; starts the background embedder
+    await connection_search.start()
+
+@app.on_event("shutdown")
+async def shutdown_connection_search():
+    await connection_search.close()
+
+@app.on_event("startup")
+async def startup_recommender():
+    # Loads stored profile vectors, then embeds any profiles missing one
+    if recommender is not None:
+        await recommender.start()
+
+@app.on_event("shutdown")
+async def shutdown_recommender():
+    if recommender is not None:
+        await recommender.close()
+
+@app.on_event("startup")
+async def startup_connection_feed():
+    await connection_feed.start()
+
+@app.on_event("shutdown")
+async def shutdown_connection_feed():
+    await connection_feed.close()
+
+@app.on_event("startup")
+async def startup_http_clients():
+    await http_clients.start()
+
+@app.on_event("startup")
+async def startup_transcription_backend():
+    # Loads and warms up the local model; a no-op for Azure
+    await transcription_backend.start()
+
+@app.on_event("shutdown")
+async def shutdown_transcription_backend():
+    await transcription_backend.close()
+
+@app.on_event("startup")
+async def startup_transcription_workers():
+    transcription_workers.start()
+
+@app.on_event("shutdown")
+async def shutdown_transcription_workers():
+    await transcription_workers.close()
+
+@app.on_event("startup")
+async def startup_follow_up_jobs():
+    await followup_jobs.resume()
+
+@app.on_event("shutdown")
+async def shutdown_follow_up_jobs():
+    await followup_jobs.close()
+
+@app.on_event("shutdown")
+async def shutdown_http_clients():
+    await http_clients.close()
+
+@app.on_event("startup")
+async def startup_qr_render_pool():
+    qr_render_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_qr_render_pool():
+    await qr_batches.close()
+    qr_render_pool.close()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
@@ -0,0 +1,161 @@
+import asyncio
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, Union
+
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionBusy(Exception):
+    pass
+
+
+class TranscriptionError(Exception):
+    pass
+
+
+class TranscriptionBackend:
+    # Common interface for speech-to-text backends. Subclasses implement
+    # _transcribe(); this class caps in-flight calls with a semaphore and
+    # bounds the wait queue, so overload turns into a fast TranscriptionBusy
+    # instead of a pile-up.
+
+    name = "base"
+    # Whether the server should split long recordings and fan them out
+    segment_long_audio = True
+
+    def __init__(self, max_concurrency: int = 8, max_waiting: int = 32, acquire_timeout: float = 5.0):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.acquire_timeout = acquire_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._in_flight = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "max_waiting": self.max_waiting,
+        }
+
+    async def _acquire(self):
+        if self._waiting >= self.max_waiting:
+            raise TranscriptionBusy("Transcription queue is full")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise TranscriptionBusy("Timed out waiting for a transcription slot")
+        finally:
+            self._waiting -= 1
+
+    async def transcribe(self, filename: str, audio: Union[bytes, BinaryIO], content_type: Optional[str]) -> str:
+        await self._acquire()
+        self._in_flight += 1
+        try:
+            with timed("transcription", self.name):
+                return await self._transcribe(filename, audio, content_type)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    async def _transcribe(self, filename: str, audio: Union[bytes, BinaryIO], content_type: Optional[str]) -> str:
+        raise NotImplementedError
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    # Runs a Whisper-family model on the local CPU through faster-whisper
+    # (CTranslate2). The model is loaded once at startup and warmed up with a
+    # second of silence so the first real request doesn't pay for it. Long
+    # clips are decoded in 30s windows and batched through the model, so the
+    # server doesn't need to segment them. faster-whisper is optional:
+    #
+    #   pip install faster-whisper
+
+    name = "local"
+    segment_long_audio = False
+
+    def __init__(
+        self,
+        model_size: str = "base",
+        device: str = "cpu",
+        compute_type: str = "int8",
+        cpu_threads: int = 0,
+        batch_size: int = 8,
+        language: Optional[str] = None,
+        warmup: bool = True,
+        max_concurrency: int = 2,
+        max_waiting: int = 32,
+        acquire_timeout: float = 30.0,
+    ):
+        super().__init__(max_concurrency, max_waiting, acquire_timeout)
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.batch_size = batch_size
+        self.language = language
+        self.warmup = warmup
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pipeline = None
+
+    def _load(self):
+        try:
+            from faster_whisper import BatchedInferencePipeline, WhisperModel
+        except ImportError:
+            raise RuntimeError("TRANSCRIPTION_BACKEND=local requires faster-whisper (pip install faster-whisper)")
+        # num_workers lets CTranslate2 serve max_concurrency threads at once
+        model = WhisperModel(
+            self.model_size,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+            num_workers=self.max_concurrency,
+        )
+        self._pipeline = BatchedInferencePipeline(model=model)
+        if self.warmup:
+            import numpy as np
+            self._run(np.zeros(16000, dtype=np.float32))
+
+    def _run(self, audio) -> str:
+        segments, _ = self._pipeline.transcribe(audio, batch_size=self.batch_size, language=self.language)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    async def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="whisper")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._load)
+            logger.info("Loaded local Whisper model %s (%s, %s)", self.model_size, self.device, self.compute_type)
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._pipeline = None
+
+    async def _transcribe(self, filename: str, audio: Union[bytes, BinaryIO], content_type: Optional[str]) -> str:
+        if self._pipeline is None:
+            await self.start()
+        if isinstance(audio, bytes):
+            audio = io.BytesIO(audio)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._run, audio)
+        except Exception as e:
+            raise TranscriptionError(f"Local transcription failed: {e}")
+
+    def stats(self) -> dict:
+        return {**super().stats(), "model": self.model_size, "loaded": self._pipeline is not None}
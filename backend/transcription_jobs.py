@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, BinaryIO, Callable, Dict, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("done", "failed")
+PUBLIC_FIELDS = ("id", "status", "filename", "transcript", "error", "attempts", "created_at", "updated_at")
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def public_job(job: dict) -> dict:
+    return {field: job.get(field) for field in PUBLIC_FIELDS}
+
+
+class MongoTranscriptionQueue:
+    # Jobs in db.transcription_jobs, audio in GridFS, so any API or worker
+    # process can pick a job up and a crashed worker's job is retried once
+    # its lease expires. The worker renews the lease while it runs, and
+    # results are only written under the claim's lease_token, so a job
+    # re-claimed elsewhere is never finished twice. Finished jobs expire
+    # through a TTL index.
+
+    def __init__(self, db, lease_seconds: float = 600.0, retention_seconds: float = 86400.0):
+        self.jobs = db.transcription_jobs
+        self.audio = AsyncIOMotorGridFSBucket(db, bucket_name="transcription_audio")
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+
+    async def enqueue(self, filename: str, content_type: Optional[str], source: BinaryIO) -> dict:
+        job_id = str(uuid.uuid4())
+        audio_id = await self.audio.upload_from_stream(
+            filename or job_id, source, metadata={"job_id": job_id, "content_type": content_type}
+        )
+        now = datetime.utcnow()
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "filename": filename,
+            "content_type": content_type,
+            "audio_id": audio_id,
+            "transcript": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.jobs.insert_one(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.jobs.find_one({"id": job_id}, {"_id": 0})
+
+    async def claim(self, owner: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "processing", "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "processing",
+                    "lease_owner": owner,
+                    "lease_token": uuid.uuid4().hex,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _leased(self, job: dict) -> dict:
+        return {"id": job["id"], "status": "processing", "lease_token": job["lease_token"]}
+
+    async def renew(self, job: dict) -> bool:
+        # False once the lease has been lost to another claim
+        result = await self.jobs.update_one(
+            self._leased(job),
+            {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+        )
+        return result.matched_count == 1
+
+    async def open_audio(self, job: dict) -> BinaryIO:
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        await self.audio.download_to_stream(job["audio_id"], spool)
+        spool.seek(0)
+        return spool
+
+    async def complete(self, job: dict, transcript: str) -> bool:
+        now = datetime.utcnow()
+        result = await self.jobs.update_one(
+            self._leased(job),
+            {"$set": {
+                "status": "done",
+                "transcript": transcript,
+                "error": None,
+                "updated_at": now,
+                "expires_at": now + timedelta(seconds=self.retention_seconds),
+                "lease_owner": None,
+                "lease_token": None,
+                "lease_expires_at": None,
+            }}
+        )
+        if result.matched_count == 0:
+            return False
+        await self._drop_audio(job)
+        return True
+
+    async def fail(self, job: dict, error: str, retry: bool) -> bool:
+        now = datetime.utcnow()
+        update = {"status": "queued" if retry else "failed", "error": error, "updated_at": now,
+                  "lease_owner": None, "lease_token": None, "lease_expires_at": None}
+        if not retry:
+            update["expires_at"] = now + timedelta(seconds=self.retention_seconds)
+        result = await self.jobs.update_one(self._leased(job), {"$set": update})
+        if result.matched_count == 0:
+            return False
+        if not retry:
+            await self._drop_audio(job)
+        return True
+
+    async def _drop_audio(self, job: dict):
+        try:
+            await self.audio.delete(job["audio_id"])
+        except Exception as e:
+            logger.warning("Could not delete audio for transcription job %s: %s", job["id"], e)
+
+
+class LocalTranscriptionQueue:
+    # In-process stand-in with the same interface: jobs in a dict, audio in
+    # temp files. Nothing survives a restart; meant for development, tests
+    # and single-process deployments. Jobs are never re-claimed, so there
+    # is no lease to renew.
+
+    lease_seconds = None
+
+    def __init__(self, work_dir: Optional[str] = None):
+        self.work_dir = tempfile.mkdtemp(prefix="transcription-jobs-", dir=work_dir)
+        self._jobs: Dict[str, dict] = {}
+        self._queued: "asyncio.Queue[str]" = asyncio.Queue()
+
+    async def enqueue(self, filename: str, content_type: Optional[str], source: BinaryIO) -> dict:
+        job_id = str(uuid.uuid4())
+        path = os.path.join(self.work_dir, job_id)
+        with open(path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        now = datetime.utcnow()
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "filename": filename,
+            "content_type": content_type,
+            "audio_path": path,
+            "transcript": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._jobs[job_id] = job
+        self._queued.put_nowait(job_id)
+        return dict(job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def claim(self, owner: str) -> Optional[dict]:
+        try:
+            job_id = self._queued.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+        job = self._jobs[job_id]
+        job.update(status="processing", attempts=job["attempts"] + 1, updated_at=datetime.utcnow())
+        return dict(job)
+
+    async def renew(self, job: dict) -> bool:
+        return True
+
+    async def open_audio(self, job: dict) -> BinaryIO:
+        return open(job["audio_path"], "rb")
+
+    async def complete(self, job: dict, transcript: str) -> bool:
+        self._jobs[job["id"]].update(status="done", transcript=transcript, error=None, updated_at=datetime.utcnow())
+        self._drop_audio(job)
+        return True
+
+    async def fail(self, job: dict, error: str, retry: bool) -> bool:
+        self._jobs[job["id"]].update(status="queued" if retry else "failed", error=error, updated_at=datetime.utcnow())
+        if retry:
+            self._queued.put_nowait(job["id"])
+        else:
+            self._drop_audio(job)
+        return True
+
+    def _drop_audio(self, job: dict):
+        if os.path.exists(job["audio_path"]):
+            os.remove(job["audio_path"])
+
+
+class TranscriptionWorkerPool:
+    # asyncio workers that drain the queue. enqueue() wakes them right away;
+    # otherwise they poll, which also picks up jobs enqueued by other
+    # processes or abandoned by a crashed worker.
+
+    def __init__(
+        self,
+        queue,
+        transcribe: Callable[[dict, BinaryIO], Awaitable[str]],
+        workers: int = 2,
+        max_attempts: int = 3,
+        poll_interval: float = 2.0,
+    ):
+        self.queue = queue
+        self.transcribe = transcribe
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+        self._listeners: Dict[str, Set[asyncio.Event]] = {}
+
+    async def enqueue(self, filename: str, content_type: Optional[str], source: BinaryIO) -> dict:
+        job = await self.queue.enqueue(filename, content_type, source)
+        self._wakeup.set()
+        return job
+
+    def start(self):
+        while len(self._tasks) < self.workers:
+            task = asyncio.create_task(self._worker())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def wait_for_update(self, job_id: str, timeout: float):
+        # Resolves when a local worker finishes the job, or after timeout so
+        # callers re-read the store for jobs handled elsewhere
+        event = asyncio.Event()
+        self._listeners.setdefault(job_id, set()).add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            listeners = self._listeners.get(job_id)
+            if listeners is not None:
+                listeners.discard(event)
+                if not listeners:
+                    del self._listeners[job_id]
+
+    def _notify(self, job_id: str):
+        for event in self._listeners.get(job_id, ()):
+            event.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self.queue.claim(self.owner)
+            except Exception:
+                logger.exception("Could not claim a transcription job")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _heartbeat(self, job: dict):
+        # Long audio can outlast the lease; keep it while the job runs
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                if not await self.queue.renew(job):
+                    logger.warning("Transcription job %s lease was lost; its result will be discarded", job["id"])
+                    return
+            except Exception as e:
+                logger.warning("Could not renew the lease on transcription job %s: %s", job["id"], e)
+
+    async def _process(self, job: dict):
+        # attempts counts claims, so a job whose workers keep dying mid-run
+        # (say, OOM on a large file) stops being re-claimed here
+        if job["attempts"] > self.max_attempts:
+            logger.warning("Transcription job %s abandoned by %s workers; giving up", job["id"], self.max_attempts)
+            if await self.queue.fail(job, "Transcription did not finish", retry=False):
+                self._notify(job["id"])
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job)) if self.queue.lease_seconds else None
+        try:
+            await self._run(job)
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _run(self, job: dict):
+        try:
+            audio = await self.queue.open_audio(job)
+            try:
+                transcript = await self.transcribe(job, audio)
+            finally:
+                audio.close()
+        except asyncio.CancelledError:
+            # Leave the job to be re-claimed once its lease expires
+            raise
+        except Exception as e:
+            retry = job["attempts"] < self.max_attempts
+            logger.warning("Transcription job %s attempt %s failed: %s", job["id"], job["attempts"], e)
+            if not await self.queue.fail(job, str(e), retry=retry):
+                logger.warning("Transcription job %s was claimed elsewhere; not recording this failure", job["id"])
+                return
+            if retry:
+                self._wakeup.set()
+            else:
+                self._notify(job["id"])
+            return
+        if not await self.queue.complete(job, transcript):
+            logger.warning("Transcription job %s was claimed elsewhere; discarding this result", job["id"])
+            return
+        self._notify(job["id"])
@@ -0,0 +1,38 @@
+# Runs transcription workers without serving HTTP, so they can be scaled
+# separately from the API. Point the API at the same database and set
+# TRANSCRIPTION_WORKERS=0 there to leave all transcription to these.
+#
+#   TRANSCRIPTION_WORKERS=4 python transcription_worker.py
+import asyncio
+import logging
+import signal
+
+import server
+
+logger = logging.getLogger("transcription_worker")
+
+
+async def main():
+    if server.TRANSCRIPTION_QUEUE == "local":
+        raise SystemExit("TRANSCRIPTION_QUEUE=local jobs only exist inside the API process")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await server.http_clients.start()
+    await server.transcription_backend.start()
+    server.transcription_workers.start()
+    logger.info("Started %s transcription workers", server.transcription_workers.workers)
+    try:
+        await stop.wait()
+    finally:
+        await server.transcription_workers.close()
+        await server.transcription_backend.close()
+        await server.http_clients.close()
+        server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorIndex:
+    # Exact cosine-similarity index held in memory. Rows are L2-normalized
+    # float32 in one preallocated matrix, so a query is a single
+    # matrix-vector product and an argpartition for the top k: tens of
+    # milliseconds for 100k rows at 384 dimensions on one core. Upserts
+    # overwrite in place or append (the matrix doubles when full); removals
+    # move the last row into the hole. Not thread-safe; used from the event
+    # loop.
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes
+
+    def _grow(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray):
+        vectors = normalize(vectors).reshape(len(ids), self.dim)
+        new = [key for key in dict.fromkeys(ids) if key not in self._rows]
+        self._grow(len(self._ids) + len(new))
+        for key in new:
+            self._rows[key] = len(self._ids)
+            self._ids.append(key)
+        rows = [self._rows[key] for key in ids]
+        self._matrix[rows] = vectors
+
+    def remove(self, key: str):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            moved = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self._ids.pop()
+
+    def vector(self, key: str) -> Optional[np.ndarray]:
+        row = self._rows.get(key)
+        return self._matrix[row].copy() if row is not None else None
+
+    def search(self, query: np.ndarray, k: int, exclude: Iterable[str] = (),
+               within: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        # Returns up to k (id, cosine similarity) pairs, best first. within
+        # restricts the search to those ids, scoring only their rows.
+        if within is None:
+            rows = np.arange(len(self._ids))
+        else:
+            rows = np.fromiter((self._rows[key] for key in within if key in self._rows), dtype=np.intp)
+        if len(rows) == 0 or k <= 0:
+            return []
+        # A contiguous slice avoids copying the matrix for the unfiltered case
+        matrix = self._matrix[rows] if within is not None else self._matrix[:len(rows)]
+        scores = matrix @ normalize(query).reshape(self.dim)
+        excluded = {self._rows[key] for key in exclude if key in self._rows}
+        if excluded:
+            scores[np.isin(rows, list(excluded))] = -np.inf
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._ids[rows[i]], float(scores[i])) for i in top if scores[i] != -np.inf]
@@ -0,0 +1,362 @@
+"""Concurrent load test / benchmark for the Lets Connect API.
+
+Three modes:
+
+  asgi       Imports backend/server.py and drives the app in-process through
+             httpx's ASGI transport. MongoDB is replaced with mongomock-motor
+             and every upstream (Azure OpenAI, Azure transcription, Cohere,
+             LinkedIn) with a mock that answers after a configurable delay.
+  http       Drives a running server at --base-url. Start it against the
+             mocked upstreams below (or with AI_PROVIDERS=template) so runs
+             don't depend on, or pay for, the real services; transcribe
+             uploads a short WAV like the app does.
+  upstreams  Serves the mocked upstreams over HTTP for http mode:
+               AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9009/openai/chat/completions
+               AZURE_TRANSCRIPTION_ENDPOINT=http://127.0.0.1:9009/openai/audio/transcriptions
+
+Every scenario reports p50/p95/p99 latency, throughput and status codes,
+and the whole run is written as JSON (--output) so runs can be compared
+across releases (--compare previous.json).
+
+  python backend_benchmark.py --mode asgi --requests 500 --concurrency 50
+  python backend_benchmark.py --mode http --base-url http://localhost:8001 \\
+      --output bench.json --compare last-release.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+import wave
+from datetime import datetime
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ["profile_create", "qr_code", "connections_list", "generate_message", "transcribe"]
+
+
+# Mocked upstreams
+
+def mock_upstream(ai_latency: float, transcribe_latency: float):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        if "transcriptions" in url:
+            await asyncio.sleep(transcribe_latency)
+            return httpx.Response(200, json={"text": "Great chatting about the benchmark harness."})
+        if "chat/completions" in url or "cohere" in url:
+            await asyncio.sleep(ai_latency)
+            body = json.loads(request.content or b"{}")
+            text = "Hi, great meeting you! Let's stay in touch."
+            if body.get("stream"):
+                chunks = [{"choices": [{"delta": {"content": word + " "}}]} for word in text.split()]
+                data = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+                return httpx.Response(200, content=data.encode(), headers={"content-type": "text/event-stream"})
+            if "cohere" in url:
+                return httpx.Response(200, json={"message": {"content": [{"type": "text", "text": text}]}})
+            return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+        if "linkedin" in url:
+            return httpx.Response(200, json={"access_token": "benchmark"})
+        return httpx.Response(404)
+    return handler
+
+
+def serve_upstreams(args):
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Route
+
+    handler = mock_upstream(args.ai_latency_ms / 1000, args.transcribe_latency_ms / 1000)
+
+    async def endpoint(request):
+        body = await request.body()
+        upstream = await handler(httpx.Request(request.method, str(request.url), content=body))
+        return Response(upstream.content, status_code=upstream.status_code, headers=dict(upstream.headers))
+
+    app = Starlette(routes=[Route("/{path:path}", endpoint, methods=["GET", "POST"])])
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# In-process app
+
+def load_app(args):
+    # Configure before import: server.py reads its settings at import time
+    os.environ.setdefault("MONGO_URL", "mongodb://benchmark")
+    os.environ.setdefault("DB_NAME", "benchmark")
+    os.environ.setdefault("TRANSCRIPTION_QUEUE", "local")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://azure-openai.invalid/openai/chat/completions")
+    os.environ.setdefault("AZURE_TRANSCRIPTION_ENDPOINT", "https://azure-speech.invalid/openai/audio/transcriptions")
+    # mongomock ignores partialFilterExpression, so the partial unique
+    # index on idempotency_key would reject every second connection
+    os.environ.setdefault("MONGO_ENSURE_INDEXES", "false")
+    sys.path.insert(0, os.path.join(ROOT_DIR, "backend"))
+
+    try:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("asgi mode needs mongomock-motor (pip install mongomock-motor)")
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+    import server
+    return server
+
+
+async def install_mock_upstreams(server, args):
+    handler = mock_upstream(args.ai_latency_ms / 1000, args.transcribe_latency_ms / 1000)
+    for name in list(server.http_clients.stats()):
+        await server.http_clients.get(name).aclose()
+        server.http_clients.set(name, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+# Scenarios
+
+def silent_wav(seconds: float = 0.5) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(16000)
+        audio.writeframes(b"\0\0" * int(16000 * seconds))
+    return buffer.getvalue()
+
+
+class BenchmarkContext:
+    def __init__(self, args):
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.user_ids = []
+        self.audio = silent_wav()
+
+    async def seed(self, client: httpx.AsyncClient):
+        for index in range(self.args.seed_profiles):
+            response = await client.post("/api/profile", json={
+                "name": f"Benchmark User {index}",
+                "email": f"bench-{self.run_id}-{index}@example.com",
+                "title": "Engineer",
+                "company": "Benchmark Inc",
+            })
+            response.raise_for_status()
+            self.user_ids.append(response.json()["id"])
+
+        remaining = self.args.seed_connections
+        while remaining > 0:
+            batch = min(remaining, 500)
+            response = await client.post("/api/connections/bulk", json={"connections": [
+                self.connection(f"seed-{remaining - offset}") for offset in range(batch)
+            ]})
+            response.raise_for_status()
+            remaining -= batch
+
+    def connection(self, tag: str) -> dict:
+        return {
+            "user_id": self.user_ids[0],
+            "contact_name": f"Contact {tag}",
+            "contact_title": "CTO",
+            "contact_company": "Acme",
+            "event_name": "BenchConf",
+            "event_type": "Conference",
+            "person_category": "Peer",
+            "notes": f"benchmark {self.run_id} {tag}",
+        }
+
+    async def request(self, client: httpx.AsyncClient, scenario: str, index: int) -> httpx.Response:
+        if scenario == "profile_create":
+            return await client.post("/api/profile", json={"name": f"Load {self.run_id} {index}"})
+        if scenario == "qr_code":
+            user_id = self.user_ids[index % len(self.user_ids)]
+            return await client.get(f"/api/qr-code/{user_id}", params={"format": "png"})
+        if scenario == "connections_list":
+            return await client.get(f"/api/connections/{self.user_ids[0]}", params={"limit": self.args.page_size})
+        if scenario == "generate_message":
+            # Distinct notes per request so the message cache doesn't answer
+            tag = "cached" if self.args.ai_cache_hits else str(index)
+            return await client.post("/api/generate-message", json=self.connection(tag))
+        if scenario == "transcribe":
+            return await client.post(
+                "/api/transcribe",
+                files={"audio_file": ("benchmark.wav", self.audio, "audio/wav")}
+            )
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+
+# Measurement
+
+def percentile(ordered, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, statuses, errors, elapsed, concurrency) -> dict:
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": len(latencies) + errors,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "errors": errors + sum(count for status, count in statuses.items() if int(status) >= 400),
+        "status_codes": statuses,
+        "latency_ms": {
+            "min": ms(ordered[0]) if ordered else 0.0,
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+            "p50": ms(percentile(ordered, 0.50)),
+            "p95": ms(percentile(ordered, 0.95)),
+            "p99": ms(percentile(ordered, 0.99)),
+            "max": ms(ordered[-1]) if ordered else 0.0,
+        },
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, context: BenchmarkContext, scenario: str) -> dict:
+    args = context.args
+    for index in range(args.warmup):
+        await context.request(client, scenario, -1 - index)
+
+    latencies = []
+    statuses = {}
+    errors = 0
+    counter = iter(range(args.requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                response = await context.request(client, scenario, index)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            key = str(response.status_code)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - started, args.concurrency)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    scenarios = args.scenarios or SCENARIOS
+    context = BenchmarkContext(args)
+    server = None
+    if args.mode == "asgi":
+        server = load_app(args)
+        await server.app.router.startup()
+        await install_mock_upstreams(server, args)
+        transport = httpx.ASGITransport(app=server.app)
+        base_url = "http://benchmark"
+    else:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        transport = httpx.AsyncHTTPTransport(limits=limits)
+        base_url = args.base_url.rstrip("/")
+
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+            await context.seed(client)
+            for scenario in scenarios:
+                print(f"Running {scenario}: {args.requests} requests, concurrency {args.concurrency}")
+                results[scenario] = await run_scenario(client, context, scenario)
+    finally:
+        if server is not None:
+            await server.app.router.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "mode": args.mode,
+            "base_url": None if args.mode == "asgi" else base_url,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "ai_latency_ms": args.ai_latency_ms if args.mode == "asgi" else None,
+            "transcribe_latency_ms": args.transcribe_latency_ms if args.mode == "asgi" else None,
+            "seed_connections": args.seed_connections,
+        },
+        "results": results,
+    }
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"\n📊 {report['meta']['mode']} @ {report['meta']['git_revision']}")
+    header = f"{'scenario':<18}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    print(header + ("   vs baseline (rps / p95)" if baseline else ""))
+    for scenario, result in report["results"].items():
+        latency = result["latency_ms"]
+        line = (f"{scenario:<18}{result['throughput_rps']:>10.1f}{latency['p50']:>10.1f}"
+                f"{latency['p95']:>10.1f}{latency['p99']:>10.1f}{result['errors']:>8}")
+        previous = (baseline or {}).get("results", {}).get(scenario)
+        if previous:
+            line += (f"   {change(previous['throughput_rps'], result['throughput_rps'])}"
+                     f" / {change(previous['latency_ms']['p95'], latency['p95'])}")
+        print(line)
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["asgi", "http", "upstreams"], default="asgi")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed-profiles", type=int, default=20)
+    parser.add_argument("--seed-connections", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--ai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--transcribe-latency-ms", type=float, default=500.0)
+    parser.add_argument("--ai-cache-hits", action="store_true", help="send identical generate-message bodies")
+    parser.add_argument("--port", type=int, default=9009, help="port for --mode upstreams")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="JSON report from an earlier run to compare against")
+    args = parser.parse_args()
+
+    if args.mode == "upstreams":
+        serve_upstreams(args)
+        return 0
+
+    report = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    failed = any(result["errors"] for result in report["results"].values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,11 +16,14 @@ class LetsConnectAPITester:
         self.test_profile = None
         self.connection_id = None
         self.qr_code_data = None
+        self.qr_code_etag = None
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, files=None):
+    def run_test(self, name, method, endpoint, expected_status, data=None, files=None, extra_headers=None):
         """Run a single API test"""
         url = f"{self.base_url}/{endpoint}"
         headers = {'Content-Type': 'application/json'}
+        if extra_headers:
+            headers.update(extra_headers)
         
         self.tests_run += 1
         print(f"\n🔍 Testing {name}...")
@@ -150,12 +153,86 @@ class LetsConnectAPITester:
             if response['qr_code'].startswith('data:image/png;base64,'):
                 print("✅ Valid QR code format")
                 self.qr_code_data = response['qr_code']
+                self.qr_code_etag = requests.get(f"{self.base_url}/api/qr-code/{self.user_id}").headers.get('ETag')
             else:
                 print("❌ Invalid QR code format")
                 success = False
         
         return success
 
+    def test_qr_code_not_modified(self):
+        """Test QR code revalidation with If-None-Match"""
+        if not self.qr_code_etag:
+            print("❌ Cannot test QR code revalidation: No ETag available")
+            return False
+            
+        success, response = self.run_test(
+            "QR Code Not Modified",
+            "GET",
+            f"api/qr-code/{self.user_id}",
+            304,
+            extra_headers={'If-None-Match': self.qr_code_etag}
+        )
+        
+        return success
+
+    def test_qr_code_formats(self):
+        """Test raw PNG and SVG QR code output"""
+        if not self.user_id:
+            print("❌ Cannot test QR code formats: No user ID available")
+            return False
+            
+        success = True
+        for fmt, media_type in (("png", "image/png"), ("svg", "image/svg+xml")):
+            ok, _ = self.run_test(
+                f"QR Code as {fmt.upper()}",
+                "GET",
+                f"api/qr-code/{self.user_id}?format={fmt}",
+                200
+            )
+            if ok:
+                content_type = requests.get(f"{self.base_url}/api/qr-code/{self.user_id}?format={fmt}").headers.get('Content-Type', '')
+                if content_type.startswith(media_type):
+                    print(f"✅ Served as {content_type}")
+                else:
+                    print(f"❌ Unexpected Content-Type: {content_type}")
+                    ok = False
+            success = success and ok
+        
+        return success
+
+    def test_qr_code_batch(self):
+        """Test bulk QR badge generation"""
+        if not self.user_id:
+            print("❌ Cannot test QR batch: No user ID available")
+            return False
+            
+        success, response = self.run_test(
+            "Create QR Badge Batch",
+            "POST",
+            "api/qr-code/batch",
+            200,
+            data={"user_ids": [self.user_id], "output": "zip"}
+        )
+        if not success:
+            return False
+        
+        job_id = response.get('job_id')
+        for _ in range(30):
+            status = requests.get(f"{self.base_url}/api/qr-code/batch/{job_id}").json()
+            print(f"Batch progress: {status.get('done')}/{status.get('total')} ({status.get('status')})")
+            if status.get('status') in ('done', 'failed'):
+                break
+            time.sleep(1)
+        
+        success, _ = self.run_test(
+            "Download QR Badge Batch",
+            "GET",
+            f"api/qr-code/batch/{job_id}/download",
+            200
+        )
+        return success
+
     def test_transcribe_audio(self):
         """Test audio transcription"""
         # Create a simple test audio file
@@ -257,6 +334,37 @@ class LetsConnectAPITester:
         
         return success
 
+    def test_bulk_connections_replay(self):
+        """Test bulk connection ingest is idempotent on replay"""
+        if not self.user_id:
+            print("❌ Cannot test bulk connections: No user ID available")
+            return False
+            
+        key = uuid.uuid4().hex
+        bulk_data = {
+            "connections": [{
+                "user_id": self.user_id,
+                "contact_name": "Offline Contact",
+                "event_name": "Tech Conference 2025",
+                "event_type": "Conference",
+                "person_category": "Peer",
+                "idempotency_key": key
+            }]
+        }
+        
+        success, first = self.run_test("Bulk Connections", "POST", "api/connections/bulk", 200, data=bulk_data)
+        if not success:
+            return False
+        success, replay = self.run_test("Bulk Connections Replay", "POST", "api/connections/bulk", 200, data=bulk_data)
+        if success:
+            if replay.get('duplicate') == 1 and replay['results'][0].get('id') == first['results'][0].get('id'):
+                print("✅ Replay did not create a duplicate")
+            else:
+                print(f"❌ Unexpected replay result: {replay}")
+                success = False
+        
+        return success
+
     def test_update_connection(self):
         """Test updating a connection with voice transcript and AI message"""
         if not self.connection_id:
@@ -313,9 +421,13 @@ def main():
         tester.test_create_profile,
         tester.test_get_profile,
         tester.test_qr_code_generation,
+        tester.test_qr_code_not_modified,
+        tester.test_qr_code_formats,
+        tester.test_qr_code_batch,
         tester.test_transcribe_audio,
         tester.test_ai_message_generation_with_event_context,
         tester.test_create_connection_with_location,
+        tester.test_bulk_connections_replay,
         tester.test_update_connection,
         tester.test_get_connections
     ]
@@ -10,6 +10,46 @@ const API = `${BACKEND_URL}/api`;
 // Initialize Gun.js
 const gun = Gun(['https://gun-manhattan.herokuapp.com/gun']);
 
+// Stream the AI message over Server-Sent Events, reporting the text so far
+const streamAiMessage = async (messageData, onText) => {
+  const response = await fetch(`${API}/generate-message/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(messageData)
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Message stream failed: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let text = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      const event = (raw.match(/^event: (.*)$/m) || [])[1];
+      const data = raw.split('\n').filter(line => line.startsWith('data: ')).map(line => line.slice(6)).join('\n');
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === 'token') {
+        text += payload.text;
+        onText(text);
+      } else if (event === 'done') {
+        onText(payload.ai_message);
+        return payload.ai_message;
+      } else if (event === 'error') {
+        throw new Error(payload.detail);
+      }
+    }
+  }
+  return text.trim();
+};
+
 function App() {
   const [currentStep, setCurrentStep] = useState('home');
   const [userProfile, setUserProfile] = useState(null);
@@ -80,9 +120,9 @@ function App() {
       setUserProfile(response.data);
       localStorage.setItem('userProfile', JSON.stringify(response.data));
       
-      // Generate QR code
-      const qrResponse = await axios.get(`${API}/qr-code/${response.data.id}`);
-      setQrCodeData(qrResponse.data.qr_code);
+      // Load the QR code as a plain image URL so the browser can cache it;
+      // the server picks the payload (QR_PAYLOAD_DEFAULT)
+      setQrCodeData(`${API}/qr-code/${response.data.id}?format=png`);
       
       // Sync to Gun.js
       gun.get('profiles').get(response.data.id).put(response.data);
@@ -135,9 +175,12 @@ function App() {
       
       qrScannerRef.current = new QrScanner(
         videoRef.current,
-        (result) => {
+        async (result) => {
           try {
-            const profileData = JSON.parse(result.data);
+            // Compact badges carry a signed token; older ones the full profile
+            const profileData = result.data.toUpperCase().startsWith('LC:')
+              ? (await axios.get(`${API}/qr-code/resolve/${encodeURIComponent(result.data)}`)).data
+              : JSON.parse(result.data);
             setScannedProfile(profileData);
             stopQRScanning();
             setCurrentStep('recording-options');
@@ -284,8 +327,10 @@ function App() {
         notes: `${recordingMode === 'introduction' ? 'Brief introduction' : 'Detailed conversation'} at ${currentEvent?.name || 'event'} - ${new Date().toLocaleDateString()}`
       };
 
-      const response = await axios.post(`${API}/generate-message`, messageData);
-      setAiMessage(response.data.ai_message);
+      // Show the message screen right away and fill it in as tokens arrive
+      setAiMessage('');
+      setCurrentStep('message-ready');
+      const generatedMessage = await streamAiMessage(messageData, setAiMessage);
       
       // Save connection to Gun.js and backend
       const connectionData = {
@@ -300,7 +345,7 @@ function App() {
         event_type: 'Networking Event',
         person_category: recordingMode === 'introduction' ? 'New Connection' : 'Potential Collaborator',
         voice_transcript: conversationText,
-        ai_message: response.data.ai_message,
+        ai_message: generatedMessage,
         recording_mode: recordingMode,
         location: location,
         created_at: new Date().toISOString()
@@ -312,8 +357,6 @@ function App() {
       // Sync to Gun.js for real-time updates
       gun.get('connections').get(connectionData.id).put(connectionData);
       
-      setCurrentStep('message-ready');
-      
     } catch (error) {
       console.error('Error generating message:', error);
       setAiMessage(`Hi ${scannedProfile.name}, great meeting you at ${currentEvent?.name || 'the event'}! Let's stay connected.`);